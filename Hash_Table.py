@@ -1,24 +1,154 @@
 # CS122 W'18: Markov models and hash tables
 # Kyle Pinder
 
+import json
+import mmap
+import struct
+from array import array
+
 
 TOO_FULL = 0.5
+TOO_EMPTY = 0.125
+TOO_DIRTY = 0.25
 GROWTH_RATIO = 2
+MIGRATE_STEP = 4
+
+# Cells of the next table allocated per update in incremental mode. After a
+# resize the table takes (TOO_FULL - TOO_FULL / GROWTH_RATIO) * cells more
+# keys before it grows again, to GROWTH_RATIO * cells cells, so allocating
+# GROWTH_RATIO / (TOO_FULL - TOO_FULL / GROWTH_RATIO) cells per update has
+# the next table ready in time.
+ALLOC_STEP = 8
+
+SUM_HASH = "sum"
+FNV_HASH = "fnv"
+
+FNV_OFFSET = 14695981039346656037
+FNV_PRIME = 1099511628211
+FNV_MASK = 2 ** 64 - 1
+
+EMPTY_SLOT = -1
+DELETED_SLOT = -2
+SHARD_SHIFT = 32
+SKETCH_DEPTH = 4
+
+# Marks the cell of a deleted key. Its key never equals a real key, so a
+# lookup probes past it, while an insertion can reuse the cell.
+TOMBSTONE = (object(), None)
+
+# On-disk layout of a table: the header (magic, cells, entries, defval, key
+# bytes, metadata bytes), the cells padded to 8 bytes, the hashes, counts
+# and key end offsets, then the keys and a JSON metadata object.
+FILE_MAGIC = b"HTBL0001"
+FILE_HEADER = struct.Struct("=8s5q")
+
+# On-disk layout of a Count_Min_Sketch: the header (magic, width, depth,
+# defval, metadata bytes), the counters, then a JSON metadata object.
+SKETCH_MAGIC = b"CMSK0001"
+SKETCH_HEADER = struct.Struct("=8s4q")
+
+
+def fnv_hash(string):
+    '''
+    Takes a string and returns its 64-bit FNV-1a hash value.
+    '''
+
+    h = FNV_OFFSET
+    for l in string:
+        h = ((h ^ ord(l)) * FNV_PRIME) & FNV_MASK
+
+    return h
+
 
+class Bulk_Operations:
+    '''
+    The bulk methods shared by the tables, written in terms of their
+    increment, update and lookup methods.
+    '''
 
-class Hash_Table:
+    def increment_many(self, keys, amounts=None):
+        '''
+        Increment the value of every key in the iterable "keys" by one, or by
+        the matching element of "amounts".
+        '''
+
+        if amounts is None:
+            for key in keys:
+                self.increment(key)
+            return
+
+        for key, amount in zip(keys, amounts):
+            self.increment(key, amount)
 
-    def __init__(self,cells,defval):
+
+    def update_many(self, pairs):
+        '''
+        Update the hash table with every (key, val) pair in "pairs".
+        '''
+
+        for key, val in pairs:
+            self.update(key, val)
+
+
+    def lookup_many(self, keys):
+        '''
+        Returns a list with the value associated with every key in "keys".
+        '''
+
+        return [self.lookup(key) for key in keys]
+
+
+class Hash_Table(Bulk_Operations):
+
+    def __init__(self,cells,defval,hash_mode=SUM_HASH,incremental=False):
         '''
         Construct a bnew hash table with a fixed number of cells equal to the
         parameter "cells", and which yields the value defval upon a lookup to a
         key that has not previously been inserted.
+
+        With hash_mode FNV_HASH the keys are hashed with FNV-1a and the number
+        of cells is rounded up to a power of two, so that a hash value is
+        reduced to an index with a mask instead of a modulo.
+
+        With incremental set, a resize keeps the old cells next to the new
+        ones and every lookup and update moves MIGRATE_STEP of the old cells
+        over, instead of re-inserting the whole table at once. The cells of
+        the next, larger table are allocated ahead of time and the cells of
+        the old one are freed afterwards, ALLOC_STEP per update, so no
+        single update re-inserts or allocates the whole table when it grows.
+        (Compacting or shrinking the table after deletions still allocates
+        its cells at once.)
+
+        Two costs remain. The next table's cells are kept in one list
+        that grows by ALLOC_STEP at a time, and CPython occasionally
+        reallocates it and copies every pointer. An update that triggers
+        such a copy takes time proportional to the size of the table: a
+        few milliseconds at millions of cells, against microseconds for
+        an ordinary update. The next table is also allocated for the whole
+        time between resizes, and the old one until it has been freed, so
+        the table holds up to about three times the cells of its current
+        size (self.cells) instead of one.
         '''
      
         self.defval = defval
+        self.hash_mode = hash_mode
+        self.mask = None
+        if hash_mode == FNV_HASH:
+            cells = 1 << max(cells - 1, 1).bit_length()
+            self.mask = cells - 1
         self.cells = cells
+        self.min_cells = cells
         self.data = [defval] * cells
         self.check_size = 0
+        self.tombstones = 0
+
+        self.incremental = incremental
+        self.old_data = None
+        self.old_cells = 0
+        self.migrate_index = 0
+        self.spare = []
+        self.spare_piece = [defval] * ALLOC_STEP
+        self.discarded = []
     
 
     def lookup(self,key):
@@ -27,17 +157,17 @@ class Hash_Table:
         or return the default value if it has not previously been inserted. 
         '''
 
-        hash_index = self.create_hash(key) 
-        if self.data[hash_index] == self.defval:
-            return self.defval
+        if self.old_data is not None:
+            self.migrate(MIGRATE_STEP)
 
-        elif key in self.data[hash_index]:
+        hash_index = self.find_slot(key, self.create_hash(key))
+        if self.data[hash_index] != self.defval:
             return self.data[hash_index][1]
 
-        else:
-            hash_index = self.find_slot(key, hash_index)
-            if self.data[hash_index] != self.defval:
-                return self.data[hash_index][1]            
+        if self.old_data is not None:
+            old_index = self.find_old_slot(key)
+            if self.old_data[old_index] != self.defval:
+                return self.old_data[old_index][1]
 
         return self.defval  
 
@@ -49,23 +179,125 @@ class Hash_Table:
         value "val".
         '''
      
-        if self.check_size / self.cells >= TOO_FULL:
-            self.rehash()
+        self.make_room()
 
-        hash_index = self.create_hash(key)
+        hash_index = self.find_insert_slot(key, self.create_hash(key))
+        d = self.data[hash_index]
 
-        if self.data[hash_index] == self.defval:
-            self.data[hash_index] = (key, val)
-            self.check_size += 1
+        if d == self.defval or d is TOMBSTONE:
+            if self.old_data is None or \
+            self.old_data[self.find_old_slot(key)] == self.defval:
+                self.check_size += 1
+            if d is TOMBSTONE:
+                self.tombstones -= 1
 
-        elif key in self.data[hash_index]:
-            self.data[hash_index] = (key, val)
+        self.data[hash_index] = (key, val)
 
+
+    def increment(self, key, amount=1):
+        '''
+        Add "amount" to the value associated with key "key", treating a key
+        that is not present as having the default value. The key is hashed
+        and probed only once.
+        '''
+
+        self.make_room()
+
+        hash_index = self.find_insert_slot(key, self.create_hash(key))
+        d = self.data[hash_index]
+        if d != self.defval and d is not TOMBSTONE:
+            self.data[hash_index] = (key, d[1] + amount)
+            return
+
+        if d is TOMBSTONE:
+            self.tombstones -= 1
+
+        val = self.defval
+        if self.old_data is not None:
+            old_index = self.find_old_slot(key)
+            if self.old_data[old_index] != self.defval:
+                val = self.old_data[old_index][1]
+            else:
+                self.check_size += 1
         else:
-            new_index = self.find_slot(key, hash_index)
-            self.data[new_index] = (key, val)
             self.check_size += 1
 
+        self.data[hash_index] = (key, val + amount)
+
+
+    def delete(self, key):
+        '''
+        Remove key "key" from the hash table, leaving a tombstone in its cell.
+        Deleting a key that is not present does nothing.
+
+        The table is compacted once tombstones take more than TOO_DIRTY of
+        the cells, and shrunk once the live keys take less than TOO_EMPTY.
+        '''
+
+        if self.old_data is not None:
+            self.migrate(MIGRATE_STEP)
+
+        found = False
+        hash_index = self.find_slot(key, self.create_hash(key))
+        if self.data[hash_index] != self.defval:
+            self.data[hash_index] = TOMBSTONE
+            self.tombstones += 1
+            found = True
+
+        if self.old_data is not None:
+            old_index = self.find_old_slot(key)
+            if self.old_data[old_index] != self.defval:
+                self.old_data[old_index] = TOMBSTONE
+                found = True
+
+        if not found:
+            return
+
+        self.check_size -= 1
+        if self.check_size / self.cells < TOO_EMPTY and \
+        self.cells > self.min_cells:
+            self.rehash(max(self.cells // GROWTH_RATIO, self.min_cells))
+
+        elif self.tombstones / self.cells > TOO_DIRTY:
+            self.rehash(self.cells)
+
+
+    def decrement(self, key, amount=1):
+        '''
+        Subtract "amount" from the value associated with key "key", and
+        delete the key once its value is back to the default value.
+        '''
+
+        if self.lookup(key) - amount == self.defval:
+            self.delete(key)
+        else:
+            self.increment(key, -amount)
+
+
+    def make_room(self):
+        '''
+        Makes sure there is room to insert a key: grows the table once the
+        live keys and tombstones take TOO_FULL of the cells (or only drops
+        the tombstones if most of them are tombstones), and otherwise
+        continues an incremental resize, the allocation of the next table's
+        cells and the freeing of the old ones.
+        '''
+
+        if (self.check_size + self.tombstones) / self.cells >= TOO_FULL:
+            if self.check_size / self.cells >= TOO_FULL / GROWTH_RATIO:
+                self.rehash()
+            else:
+                self.rehash(self.cells)
+
+        else:
+            if self.old_data is not None:
+                self.migrate(MIGRATE_STEP)
+            if self.incremental and \
+            len(self.spare) < self.cells * GROWTH_RATIO:
+                self.spare += self.spare_piece
+            if self.discarded:
+                del self.discarded[-ALLOC_STEP:]
+
 
     def find_slot(self, key, hash_index):
         '''
@@ -73,6 +305,13 @@ class Hash_Table:
         hash index.
         '''
 
+        if self.mask is not None:
+            while (self.data[hash_index] != self.defval and \
+            self.data[hash_index][0] != key):
+                hash_index = (hash_index + 1) & self.mask
+
+            return hash_index
+
         while (self.data[hash_index] != self.defval and \
         self.data[hash_index][0] != key):
             hash_index = (hash_index + 1) % self.cells
@@ -80,31 +319,843 @@ class Hash_Table:
         return hash_index
 
 
-    def rehash(self):
+    def find_insert_slot(self, key, hash_index):
+        '''
+        Takes the key and the hash index and finds the slot that holds the
+        key or, if the key is not present, the first tombstone or empty slot
+        where it can be inserted.
+        '''
+
+        slot = self.find_slot(key, hash_index)
+        if self.tombstones == 0 or self.data[slot] != self.defval:
+            return slot
+
+        while hash_index != slot:
+            if self.data[hash_index] is TOMBSTONE:
+                return hash_index
+            hash_index = (hash_index + 1) % self.cells
+
+        return slot
+
+
+    def find_old_slot(self, key):
+        '''
+        Takes the key and finds its slot among the cells that are still being
+        migrated after an incremental resize.
+        '''
+
+        hash_index = self.create_hash(key, self.old_cells)
+        while (self.old_data[hash_index] != self.defval and \
+        self.old_data[hash_index][0] != key):
+            hash_index = (hash_index + 1) % self.old_cells
+
+        return hash_index
+
+
+    def rehash(self, cells=None):
         '''
-        Increases the size of the hash table and updates the table with the new 
-        values.
+        Increases the size of the hash table (or resizes it to "cells" cells)
+        and updates the table with the new values, dropping any tombstones.
         '''
+
+        if self.old_data is not None:
+            self.migrate(self.old_cells)
     
-        self.cells *= GROWTH_RATIO
         hold_data = self.data
+        hold_cells = self.cells
+        if cells is None:
+            cells = self.cells * GROWTH_RATIO
+        self.cells = cells
+        if self.mask is not None:
+            self.mask = self.cells - 1
+        self.tombstones = 0
+
+        if self.incremental:
+            self.data = self.spare
+            self.spare = []
+            if len(self.data) < cells:
+                self.data.extend([self.defval] * (cells - len(self.data)))
+            else:
+                del self.data[cells:]
+            self.old_data = hold_data
+            self.old_cells = hold_cells
+            self.migrate_index = 0
+            return
+
         self.data = [self.defval] * self.cells
         for d in hold_data:
-            if d != self.defval:
-                self.update(d[0], d[1])  
+            if d != self.defval and d is not TOMBSTONE:
+                self.data[self.find_slot(d[0], self.create_hash(d[0]))] = d
+
+
+    def migrate(self, steps):
+        '''
+        Moves up to "steps" cells of the old table into the current one and
+        drops the old table once all of its cells have been moved (its list
+        is kept in self.discarded, which make_room frees a piece at a time).
+        '''
+
+        stop = min(self.migrate_index + steps, self.old_cells)
+        for i in range(self.migrate_index, stop):
+            d = self.old_data[i]
+            if d != self.defval and d is not TOMBSTONE:
+                hash_index = self.find_slot(d[0], self.create_hash(d[0]))
+                if self.data[hash_index] == self.defval:
+                    self.data[hash_index] = d
+
+        self.migrate_index = stop
+        if stop == self.old_cells:
+            self.discarded = self.old_data
+            self.old_data = None
+            self.old_cells = 0
          
 
-    def create_hash(self, string):
+    def create_hash(self, string, cells=None):
         '''
         Takes a string and returns the hash value of the string.
         '''
+
+        if cells is None:
+            cells = self.cells
+
+        if self.mask is not None:
+            return fnv_hash(string) & (cells - 1)
    
         letter_tot = 0 
 
         letter_tot = sum(ord(l) for l in string)
 
-        letter_tot = (letter_tot * 37) % self.cells
+        letter_tot = (letter_tot * 37) % cells
+
+        return letter_tot
+
+
+    def items(self):
+        '''
+        Yields the (key, value) pairs stored in the hash table.
+        '''
+
+        for d in self.data:
+            if d != self.defval and d is not TOMBSTONE:
+                yield d
+        if self.old_data is not None:
+            for d in self.old_data[self.migrate_index:]:
+                if d != self.defval and d is not TOMBSTONE and \
+                self.data[self.find_slot(d[0], self.create_hash(d[0]))] == \
+                self.defval:
+                    yield d
+
+
+    def probe_histogram(self):
+        '''
+        Returns a dictionary mapping a probe length to the number of keys
+        that a lookup finds after exactly that many probes.
+        '''
+
+        histogram = {}
+        for i, d in enumerate(self.data):
+            if d != self.defval and d is not TOMBSTONE:
+                probes = (i - self.create_hash(d[0])) % self.cells + 1
+                histogram[probes] = histogram.get(probes, 0) + 1
+
+        return histogram
+
+
+    def average_probe_length(self):
+        '''
+        Returns the average number of probes a lookup of a stored key takes.
+        '''
+
+        histogram = self.probe_histogram()
+        num_keys = sum(histogram.values())
+        if num_keys == 0:
+            return 0.0
+
+        return sum(p * n for p, n in histogram.items()) / num_keys
+
+
+class Compact_Hash_Table(Bulk_Operations):
+
+    def __init__(self,cells,defval=0):
+        '''
+        Construct a new hash table for integer values (counts) with at least
+        "cells" cells, which yields defval upon a lookup to a key that has not
+        previously been inserted.
+
+        The cells only hold the index of an entry. The entries are stored in
+        parallel arrays of FNV-1a hash values and values, and the keys are
+        stored back to back as UTF-8 in a single byte string, so that an entry
+        costs a few machine words instead of a tuple and its objects.
+
+        A deleted key leaves DELETED_SLOT in its cell and its entry in the
+        arrays until the next rehash, which drops the dead entries. As in
+        Hash_Table, the table is compacted once the deleted cells take more
+        than TOO_DIRTY of the cells, and shrunk once the live keys take less
+        than TOO_EMPTY.
+        '''
+
+        cells = 1 << max(cells - 1, 1).bit_length()
+        self.defval = defval
+        self.cells = cells
+        self.min_cells = cells
+        self.mask = cells - 1
+        self.slots = array('i', [EMPTY_SLOT]) * cells
+        self.hashes = array('Q')
+        self.counts = array('q')
+        self.key_ends = array('q')
+        self.key_blob = bytearray()
+        self.check_size = 0
+        self.tombstones = 0
+        self.dead_entries = set()
+
+
+    def lookup(self,key,h=None):
+        '''
+        Retrieve the value associated with the specified key in the hash table,
+        or return the default value if it has not previously been inserted.
+        The methods that take "h" use it as the hash value of the key if it
+        is given, instead of hashing the key again.
+        '''
+
+        if h is None:
+            h = fnv_hash(key)
+
+        entry = self.slots[self.find_slot(key, h)]
+        if entry == EMPTY_SLOT:
+            return self.defval
+
+        return self.counts[entry]
+
+
+    def update(self,key,val,h=None):
+        '''
+        Change the value associated with key "key" to value "val".
+        If "key" is not currently present in the hash table, insert it with
+        value "val".
+        '''
+
+        self.make_room()
+
+        if h is None:
+            h = fnv_hash(key)
+        hash_index = self.find_slot(key, h)
+        entry = self.slots[hash_index]
+
+        if entry == EMPTY_SLOT:
+            self.slots[hash_index] = self.add_entry(key, h, val)
+        else:
+            self.counts[entry] = val
+
+
+    def increment(self, key, amount=1, h=None):
+        '''
+        Add "amount" to the value associated with key "key", treating a key
+        that is not present as having the default value. The key is hashed
+        and probed only once.
+        '''
+
+        self.make_room()
+
+        if h is None:
+            h = fnv_hash(key)
+        hash_index = self.find_slot(key, h)
+        entry = self.slots[hash_index]
+
+        if entry == EMPTY_SLOT:
+            self.slots[hash_index] = self.add_entry(key, h,
+                                                    self.defval + amount)
+        else:
+            self.counts[entry] += amount
+
+
+    def delete(self, key, h=None):
+        '''
+        Remove key "key" from the hash table. Deleting a key that is not
+        present does nothing.
+        '''
+
+        if h is None:
+            h = fnv_hash(key)
+
+        hash_index = self.find_slot(key, h)
+        entry = self.slots[hash_index]
+        if entry == EMPTY_SLOT:
+            return
+
+        self.slots[hash_index] = DELETED_SLOT
+        self.dead_entries.add(entry)
+        self.tombstones += 1
+        self.check_size -= 1
+
+        if self.check_size / self.cells < TOO_EMPTY and \
+        self.cells > self.min_cells:
+            self.rehash(max(self.cells // GROWTH_RATIO, self.min_cells))
+
+        elif self.tombstones / self.cells > TOO_DIRTY:
+            self.rehash(self.cells)
+
+
+    def decrement(self, key, amount=1, h=None):
+        '''
+        Subtract "amount" from the value associated with key "key", and
+        delete the key once its value is back to the default value.
+        '''
+
+        if h is None:
+            h = fnv_hash(key)
+
+        entry = self.slots[self.find_slot(key, h)]
+        if entry == EMPTY_SLOT:
+            self.increment(key, -amount, h)
+        elif self.counts[entry] - amount == self.defval:
+            self.delete(key, h)
+        else:
+            self.counts[entry] -= amount
+
+
+    def make_room(self):
+        '''
+        Grows the table once the live keys and deleted cells take TOO_FULL
+        of the cells, or only drops the deleted cells if most of them are
+        deleted.
+        '''
+
+        if (self.check_size + self.tombstones) / self.cells >= TOO_FULL:
+            if self.check_size / self.cells >= TOO_FULL / GROWTH_RATIO:
+                self.rehash()
+            else:
+                self.rehash(self.cells)
+
+
+    def add_entry(self, key, h, val):
+        '''
+        Appends a new entry to the entry arrays and returns its index.
+        '''
+
+        self.key_blob += key.encode("utf-8", "surrogatepass")
+        self.key_ends.append(len(self.key_blob))
+        self.hashes.append(h)
+        self.counts.append(val)
+        self.check_size += 1
+
+        return len(self.counts) - 1
+
+
+    def get_key(self, entry):
+        '''
+        Returns the key of the entry with the given index.
+        '''
+
+        start = self.key_ends[entry - 1] if entry > 0 else 0
+
+        return str(self.key_blob[start:self.key_ends[entry]], "utf-8",
+                   "surrogatepass")
+
+
+    def find_slot(self, key, h):
+        '''
+        Takes the key and its hash value and finds the slot that holds the
+        key, or the empty slot where it would be inserted.
+        '''
+
+        hash_index = h & self.mask
+        entry = self.slots[hash_index]
+        while entry != EMPTY_SLOT:
+            if entry >= 0 and self.hashes[entry] == h and \
+            self.get_key(entry) == key:
+                return hash_index
+            hash_index = (hash_index + 1) & self.mask
+            entry = self.slots[hash_index]
+
+        return hash_index
+
+
+    def rehash(self, cells=None):
+        '''
+        Increases the size of the hash table (or resizes it to "cells"
+        cells), drops the entries of deleted keys and places the entries in
+        the new cells using their stored hash values.
+        '''
+
+        if self.dead_entries:
+            self.drop_dead_entries()
+
+        if cells is None:
+            cells = self.cells * GROWTH_RATIO
+        self.cells = cells
+        self.mask = self.cells - 1
+        self.slots = array('i', [EMPTY_SLOT]) * self.cells
+        self.tombstones = 0
+
+        for entry, h in enumerate(self.hashes):
+            hash_index = h & self.mask
+            while self.slots[hash_index] != EMPTY_SLOT:
+                hash_index = (hash_index + 1) & self.mask
+            self.slots[hash_index] = entry
+
+
+    def drop_dead_entries(self):
+        '''
+        Rebuilds the entry arrays and the keys without the entries of
+        deleted keys.
+        '''
+
+        hashes = array('Q')
+        counts = array('q')
+        key_ends = array('q')
+        key_blob = bytearray()
+
+        for entry in self.live_entries():
+            start = self.key_ends[entry - 1] if entry > 0 else 0
+            key_blob += self.key_blob[start:self.key_ends[entry]]
+            key_ends.append(len(key_blob))
+            hashes.append(self.hashes[entry])
+            counts.append(self.counts[entry])
+
+        self.hashes = hashes
+        self.counts = counts
+        self.key_ends = key_ends
+        self.key_blob = key_blob
+        self.dead_entries = set()
+
+
+    def live_entries(self):
+        '''
+        Yields the indices of the entries of the keys in the table.
+        '''
+
+        for entry in range(len(self.counts)):
+            if entry not in self.dead_entries:
+                yield entry
+
+
+    def merge(self, other):
+        '''
+        Adds the values of another Compact_Hash_Table to this one. The
+        entries are placed using the hash values stored in "other", so no key
+        is hashed again.
+        '''
+
+        for entry in other.live_entries():
+            self.make_room()
+
+            h = other.hashes[entry]
+            key = other.get_key(entry)
+            hash_index = self.find_slot(key, h)
+            found = self.slots[hash_index]
+
+            if found == EMPTY_SLOT:
+                self.slots[hash_index] = self.add_entry(key, h,
+                                                        other.counts[entry])
+            else:
+                self.counts[found] += other.counts[entry]
+
+
+    def items(self):
+        '''
+        Yields the (key, value) pairs stored in the hash table.
+        '''
+
+        for entry in self.live_entries():
+            yield (self.get_key(entry), self.counts[entry])
+
+
+    def probe_histogram(self):
+        '''
+        Returns a dictionary mapping a probe length to the number of keys
+        that a lookup finds after exactly that many probes.
+        '''
+
+        histogram = {}
+        for i, entry in enumerate(self.slots):
+            if entry >= 0:
+                probes = (i - self.hashes[entry]) % self.cells + 1
+                histogram[probes] = histogram.get(probes, 0) + 1
+
+        return histogram
+
+
+    def nbytes(self):
+        '''
+        Returns the number of bytes used by the cells, entries and keys.
+        '''
+
+        return (self.slots.itemsize * len(self.slots) +
+                self.hashes.itemsize * len(self.hashes) +
+                self.counts.itemsize * len(self.counts) +
+                self.key_ends.itemsize * len(self.key_ends) +
+                len(self.key_blob))
+
+
+class Sharded_Hash_Table(Bulk_Operations):
+
+    def __init__(self,shards,cells,defval=0):
+        '''
+        Construct a hash table for integer values that is split into "shards"
+        Compact_Hash_Tables of "cells" cells each. A key always goes to the
+        shard chosen by the high bits of its hash value, so tables counted
+        separately (e.g. by different processes) can be combined shard by
+        shard with merge. Each key is hashed once, to choose its shard, and
+        the shard reuses the hash value.
+        '''
+
+        self.defval = defval
+        self.shards = [Compact_Hash_Table(cells, defval)
+                       for _ in range(shards)]
+
+
+    def get_shard(self, h):
+        '''
+        Returns the shard that holds the keys with hash value "h".
+        '''
+
+        return self.shards[(h >> SHARD_SHIFT) % len(self.shards)]
+
+
+    def lookup(self,key):
+        '''
+        Retrieve the value associated with the specified key in the hash table,
+        or return the default value if it has not previously been inserted.
+        '''
+
+        h = fnv_hash(key)
+
+        return self.get_shard(h).lookup(key, h)
+
+
+    def update(self,key,val):
+        '''
+        Change the value associated with key "key" to value "val".
+        '''
+
+        h = fnv_hash(key)
+        self.get_shard(h).update(key, val, h)
+
+
+    def increment(self, key, amount=1):
+        '''
+        Add "amount" to the value associated with key "key".
+        '''
+
+        h = fnv_hash(key)
+        self.get_shard(h).increment(key, amount, h)
+
+
+    def delete(self, key):
+        '''
+        Remove key "key" from the hash table.
+        '''
+
+        h = fnv_hash(key)
+        self.get_shard(h).delete(key, h)
+
+
+    def decrement(self, key, amount=1):
+        '''
+        Subtract "amount" from the value associated with key "key", deleting
+        the key once its value is back to the default value.
+        '''
+
+        h = fnv_hash(key)
+        self.get_shard(h).decrement(key, amount, h)
+
+
+    def merge(self, other):
+        '''
+        Adds the values of another Sharded_Hash_Table with the same number of
+        shards to this one, merging each pair of shards.
+        '''
+
+        if len(other.shards) != len(self.shards):
+            raise ValueError("cannot merge tables with different shard counts")
+
+        for shard, other_shard in zip(self.shards, other.shards):
+            shard.merge(other_shard)
+
+
+    def items(self):
+        '''
+        Yields the (key, value) pairs stored in the hash table.
+        '''
+
+        for shard in self.shards:
+            yield from shard.items()
+
+
+    def nbytes(self):
+        '''
+        Returns the number of bytes used by all shards.
+        '''
+
+        return sum(shard.nbytes() for shard in self.shards)
+
+
+class Count_Min_Sketch(Bulk_Operations):
+
+    def __init__(self,width,depth=SKETCH_DEPTH,defval=0):
+        '''
+        Construct a count-min sketch with "depth" rows of "width" counters.
+        It takes the place of a hash table of counts in a fixed amount of
+        memory: every key increments one counter per row, and a lookup
+        returns the smallest of its counters, which is never less than the
+        true count and exceeds it only when other keys share all of them.
+        Keys are not stored, so a sketch cannot be iterated or updated.
+        '''
+
+        self.defval = defval
+        self.width = width
+        self.depth = depth
+        self.counts = array('q', [0]) * (width * depth)
+
+
+    def get_cells(self, key):
+        '''
+        Returns the index of the counter of the key in each row, derived from
+        the two halves of its FNV-1a hash value.
+        '''
+
+        h = fnv_hash(key)
+        h1 = h & 0xffffffff
+        h2 = (h >> 32) | 1
+
+        return [row * self.width + (h1 + row * h2) % self.width
+                for row in range(self.depth)]
+
+
+    def lookup(self,key):
+        '''
+        Retrieve the estimated count of the key, or the default value if the
+        key has not been counted.
+        '''
+
+        return self.defval + min(self.counts[i] for i in self.get_cells(key))
+
+
+    def increment(self, key, amount=1):
+        '''
+        Add "amount" to the count of key "key".
+        '''
+
+        for i in self.get_cells(key):
+            self.counts[i] += amount
+
+
+    def update_many(self, pairs):
+        '''
+        A sketch cannot set the value of a key, only add to it.
+        '''
+
+        raise TypeError("a Count_Min_Sketch cannot be updated")
+
+
+    def merge(self, other):
+        '''
+        Adds the counts of another sketch of the same shape to this one.
+        '''
+
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge sketches of different shapes")
+
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+
+
+    def nbytes(self):
+        '''
+        Returns the number of bytes used by the counters.
+        '''
+
+        return self.counts.itemsize * len(self.counts)
+
+
+def sketch_for_budget(budget, depth=SKETCH_DEPTH, defval=0):
+    '''
+    Creates the widest Count_Min_Sketch of the given depth whose counters
+    fit in "budget" bytes.
+    '''
+
+    return Count_Min_Sketch(max(budget // (8 * depth), 1), depth, defval)
+
+
+class Mapped_Hash_Table(Compact_Hash_Table):
+
+    def __init__(self,filename):
+        '''
+        Open a hash table written by save_table. The file is mapped into
+        memory and the lookups read the cells, entries and keys directly from
+        the mapping, so processes that open the same file share one copy of
+        it in the page cache. The table is read-only.
+        '''
+
+        with open(filename, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, cells, num_entries, defval, blob_len, meta_len) = \
+            FILE_HEADER.unpack_from(self.mm)
+        if magic != FILE_MAGIC:
+            raise ValueError(filename + " is not a hash table file")
+
+        view = memoryview(self.mm)
+        offset = FILE_HEADER.size
+        slots_len = 4 * cells
+        self.slots = view[offset:offset + slots_len].cast('i')
+        offset += slots_len + slots_len % 8
+        self.hashes = view[offset:offset + 8 * num_entries].cast('Q')
+        offset += 8 * num_entries
+        self.counts = view[offset:offset + 8 * num_entries].cast('q')
+        offset += 8 * num_entries
+        self.key_ends = view[offset:offset + 8 * num_entries].cast('q')
+        offset += 8 * num_entries
+        self.key_blob = view[offset:offset + blob_len]
+        offset += blob_len
+        self.meta = json.loads(str(view[offset:offset + meta_len], "utf-8"))
+
+        self.defval = defval
+        self.cells = cells
+        self.min_cells = cells
+        self.mask = cells - 1
+        self.check_size = num_entries
+        self.tombstones = 0
+        self.dead_entries = set()
+
+
+    def update(self,key,val,h=None):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+    def increment(self, key, amount=1, h=None):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+    def delete(self, key, h=None):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+    def decrement(self, key, amount=1, h=None):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+    def merge(self, other):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+    def rehash(self, cells=None):
+        '''
+        A mapped table cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Hash_Table is read-only")
+
+
+class Mapped_Count_Min_Sketch(Count_Min_Sketch):
+
+    def __init__(self,filename):
+        '''
+        Open a count-min sketch written by save_table. The counters are read
+        directly from the memory-mapped file, as in Mapped_Hash_Table. The
+        sketch is read-only.
+        '''
+
+        with open(filename, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, width, depth, defval, meta_len) = \
+            SKETCH_HEADER.unpack_from(self.mm)
+        if magic != SKETCH_MAGIC:
+            raise ValueError(filename + " is not a count-min sketch file")
+
+        view = memoryview(self.mm)
+        offset = SKETCH_HEADER.size
+        self.counts = view[offset:offset + 8 * width * depth].cast('q')
+        offset += 8 * width * depth
+        self.meta = json.loads(str(view[offset:offset + meta_len], "utf-8"))
+
+        self.defval = defval
+        self.width = width
+        self.depth = depth
+
+
+    def increment(self, key, amount=1):
+        '''
+        A mapped sketch cannot be changed.
+        '''
+
+        raise TypeError("a Mapped_Count_Min_Sketch is read-only")
+
+
+def open_table(filename):
+    '''
+    Opens a file written by save_table as a Mapped_Hash_Table or, for a
+    Count_Min_Sketch, a Mapped_Count_Min_Sketch.
+    '''
+
+    with open(filename, "rb") as f:
+        magic = f.read(len(SKETCH_MAGIC))
+
+    if magic == SKETCH_MAGIC:
+        return Mapped_Count_Min_Sketch(filename)
+
+    return Mapped_Hash_Table(filename)
+
+
+def save_table(table, filename, meta=None):
+    '''
+    Writes a hash table with integer values to a file that can be opened
+    with Mapped_Hash_Table, or a Count_Min_Sketch to a file that can be
+    opened with Mapped_Count_Min_Sketch (open_table opens either).
+
+    Inputs:
+        table: (Compact_Hash_Table, Hash_Table or Count_Min_Sketch) the
+          table to write
+        filename: (string) the name of the file
+        meta: (dict) JSON-serializable data stored along with the table
+    '''
+
+    meta_bytes = json.dumps(meta if meta is not None else {}).encode("utf-8")
+
+    if isinstance(table, Count_Min_Sketch):
+        with open(filename, "wb") as f:
+            f.write(SKETCH_HEADER.pack(SKETCH_MAGIC, table.width, table.depth,
+                                       table.defval, len(meta_bytes)))
+            f.write(bytes(table.counts))
+            f.write(meta_bytes)
+        return
+
+    if not isinstance(table, Compact_Hash_Table):
+        compact = Compact_Hash_Table(1, table.defval)
+        compact.update_many(table.items())
+        table = compact
+    elif table.dead_entries:
+        table.rehash(table.cells)
 
-        return letter_tot 
-           
+    padding = bytes(4 * table.cells % 8)
 
+    with open(filename, "wb") as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, table.cells, table.check_size,
+                                 table.defval, len(table.key_blob),
+                                 len(meta_bytes)))
+        for a in [table.slots, padding, table.hashes, table.counts,
+                  table.key_ends]:
+            f.write(bytes(a))
+        f.write(bytes(table.key_blob))
+        f.write(meta_bytes)
@@ -3,21 +3,42 @@
 
 import sys
 import math
+from collections import OrderedDict, deque
+from multiprocessing import Pool
 import Hash_Table
 
 HASH_CELLS = 57
+CHUNK_SIZE = 1 << 20
+LOG_PROB_CACHE_SIZE = 1 << 16
+
+PYTHON_ENGINE = "python"
+NUMPY_ENGINE = "numpy"
 
 class Markov:
 
-    def __init__(self,k,s):
+    def __init__(self,k,s,workers=1,engine=PYTHON_ENGINE,memory_budget=None):
         '''
         Construct a new k-order Markov model using the statistics of string "s"
+        With workers > 1 the k-grams are counted by a pool of that many
+        processes. With engine NUMPY_ENGINE they are counted with array
+        operations instead of one slice per position.
+
+        With memory_budget set, the counts are kept approximately in a
+        Count_Min_Sketch of that many bytes instead of a hash table (counted
+        in this process, with either engine).
         '''
 
         self.k = k
         self.s = s
-        self.ht = self.create_hash_table(k, s)
-        self.num_char_used = self.get_char_used(s)
+        self.memory_budget = memory_budget
+        if engine == NUMPY_ENGINE:
+            (self.ht, self.num_char_used) = self.create_hash_table_numpy(k, s)
+        elif workers > 1 and memory_budget is None:
+            (self.ht, self.num_char_used) = create_hash_table_parallel(
+                k, s, workers)
+        else:
+            (self.ht, self.num_char_used) = self.create_hash_table(k, s)
+        self.log_prob_cache = OrderedDict()
         
 
     def log_probability(self,s):
@@ -29,57 +50,601 @@ class Markov:
 
         prob = 0
         k = self.k
-        S = self.num_char_used
-        
-        sps_k = s + s[:k]
+        gram_log_probability = self.gram_log_probability
 
         sps_k1 = s + s[:k+1]
 
         for r in range(len(s)):
-            N = self.ht.lookup(sps_k[r:r+k])
-            M = self.ht.lookup(sps_k1[r:r+k+1])
+            prob += gram_log_probability(sps_k1[r:r+k+1])
+
+        return prob
+
+
+    def scorer(self, window=None):
+        '''
+        Returns an Incremental_Scorer that scores text appended to it with
+        this model.
+        '''
+
+        return Incremental_Scorer(self, window)
+
+
+    def gram_log_probability(self, gram):
+        '''
+        Get the smoothed log probability of the last character of a
+        (k+1)-gram following its first k characters. The LOG_PROB_CACHE_SIZE
+        most recently used results are kept in self.log_prob_cache, so
+        scoring repeats only one lookup per distinct (k+1)-gram.
+        '''
 
-            prob += math.log((M+1)/(N+S))
+        cache = self.log_prob_cache
+        prob = cache.get(gram)
+        if prob is not None:
+            cache.move_to_end(gram)
+            return prob
+
+        prob = self.compute_gram_log_probability(gram)
+        cache[gram] = prob
+        if len(cache) > LOG_PROB_CACHE_SIZE:
+            cache.popitem(last=False)
 
         return prob
 
+
+    def compute_gram_log_probability(self, gram):
+        '''
+        Computes the smoothed log probability of the last character of a
+        (k+1)-gram following its first k characters from the counts.
+        '''
+
+        N = self.ht.lookup(gram[:self.k])
+        M = self.ht.lookup(gram)
+
+        return math.log((M+1)/(N+self.num_char_used))
+
  
-    def get_char_used(self, s):
-        ''' 
-        Appends a character to a list if it has not been seen before and returns
-        the length of the used character list.
+    def save(self, filename):
+        '''
+        Writes the statistics of the model to a file that load_markov opens.
+        '''
+
+        Hash_Table.save_table(self.ht, filename,
+                              {"k": self.k,
+                               "num_char_used": self.num_char_used})
+
+
+    def create_hash_table_numpy(self, k, s):
+        '''
+        Creates the hash table from a given key and string with
+        count_grams_numpy, and counts the characters used in the same
+        encoding pass.
+
+        Returns: the hash table and the number of characters used
         '''
 
-        char_used = []
+        import numpy as np
+
+        if len(s) <= k:
+            return self.create_hash_table(k, s)
+
+        (codes, num_char_used) = encode_text(s)
+
+        ht = self.new_table()
+        count_grams_numpy(ht, s + s[:k+1],
+                          np.concatenate((codes, codes[:k+1])),
+                          len(s), [k, k+1])
 
-        for char in s:
-            if char not in char_used:
-                char_used.append(char)
+        return (ht, num_char_used)
 
-        return len(char_used)
 
         
+    def new_table(self):
+        '''
+        Creates the empty table that the counts are added to.
+        '''
+
+        if self.memory_budget is not None:
+            return Hash_Table.sketch_for_budget(self.memory_budget)
+
+        return Hash_Table.Compact_Hash_Table(HASH_CELLS, 0)
+
+
     def create_hash_table(self, k, s):
         '''
         Creates the hash table from a given key and string.
-        '''
 
-        ht = Hash_Table.Hash_Table(HASH_CELLS, 0)
+        Returns: the hash table and the number of characters used
+        '''
 
-        sps_k = s + s[:k]
+        ht = self.new_table()
 
         sps_k1 = s + s[:k+1]
 
-        for r in range(len(s)):
-            val1 = ht.lookup(sps_k[r:r+k])
-            ht.update(sps_k[r:r+k], val1+1)
+        chars_used = count_grams(ht, sps_k1, k, len(s))
+
+        return (ht, len(chars_used))
 
-            val2 = ht.lookup(sps_k1[r:r+k+1])
-            ht.update(sps_k1[r:r+k+1], val2+1)
 
-        return ht
+def count_grams(ht, sps, k, num_starts):
+    '''
+    Counts the k-grams and (k+1)-grams that start in the first "num_starts"
+    positions of a string, and collects the characters at those positions
+    in the same loop.
+
+    Inputs:
+        ht: the hash table to add the counts to
+        sps: (string) the string, long enough for every gram to fit
+        k: (int) the order of the model
+        num_starts: (int) the number of starting positions
+
+    Returns: the set of characters at the starting positions
+    '''
+
+    chars_used = set()
+
+    for r in range(num_starts):
+        gram = sps[r:r+k+1]
+        chars_used.add(gram[0])
+        ht.increment(gram[:k])
+        ht.increment(gram)
+
+    return chars_used
         
 
+def gram_ranks(codes, max_length):
+    '''
+    Numbers the substrings of each length 0..max_length of an encoded
+    string, so that two positions get the same number exactly when the
+    substrings starting there are equal. The numbers for length j+1 are found
+    by ranking the pairs (number for length j, next character), which keeps
+    them exact for any length.
+
+    Inputs:
+        codes: (array) the characters of the string as integers 0..A-1
+        max_length: (int) the length of the longest substrings
+
+    Yields: for each length in order, an array with one number per position
+        where a substring of that length fits
+    '''
+
+    import numpy as np
+
+    alphabet = int(codes.max()) + 1 if len(codes) > 0 else 1
+    ranks = np.zeros(len(codes) + 1, dtype=np.int64)
+    yield ranks
+
+    for j in range(max_length):
+        pairs = ranks[:len(codes) - j] * alphabet + codes[j:]
+        ranks = np.unique(pairs, return_inverse=True)[1].reshape(-1)
+        yield ranks
+
+
+def encode_text(s):
+    '''
+    Maps the characters of a string to the integers 0..A-1 in one pass,
+    where A is the number of distinct characters, for the NumPy engine.
+
+    Inputs:
+        s: (string) the text
+
+    Returns: an array with the code of each character of "s", and A
+    '''
+
+    import numpy as np
+
+    points = np.frombuffer(s.encode("utf-32-le", "surrogatepass"),
+                           dtype=np.uint32)
+    (chars, codes) = np.unique(points, return_inverse=True)
+
+    return (codes.reshape(-1).astype(np.int64), len(chars))
+
+
+def count_grams_numpy(ht, sps, codes, num_starts, lengths):
+    '''
+    Counts the substrings of the given lengths that start in the first
+    "num_starts" positions of a string, numbering them with gram_ranks and
+    counting the numbers with np.unique, so that only one slice per distinct
+    substring is taken.
+
+    Inputs:
+        ht: the hash table to add the counts to
+        sps: (string) the string, long enough for every substring to fit
+        codes: (array) the character codes of "sps" from encode_text
+        num_starts: (int) the number of starting positions
+        lengths: (list) the lengths of the substrings to count
+    '''
+
+    import numpy as np
+
+    for length, ranks in enumerate(gram_ranks(codes, max(lengths))):
+        if length in lengths:
+            (_, first, counts) = np.unique(ranks[:num_starts],
+                                           return_index=True,
+                                           return_counts=True)
+            ht.increment_many((sps[r:r+length] for r in first.tolist()),
+                              counts.tolist())
+
+
+def count_chunk(args):
+    '''
+    Counts the k-grams and (k+1)-grams that start in the first "num_starts"
+    positions of a chunk of text into a Sharded_Hash_Table.
+
+    Inputs:
+        args: (tuple) k, the chunk, num_starts and the number of shards
+
+    Returns: Sharded_Hash_Table and the set of characters at the starting
+        positions
+    '''
+
+    (k, chunk, num_starts, shards) = args
+    ht = Hash_Table.Sharded_Hash_Table(shards, HASH_CELLS)
+    chars_used = count_grams(ht, chunk, k, num_starts)
+
+    return (ht, chars_used)
+
+
+def merge_shards(shards):
+    '''
+    Merges the same shard of the tables counted by different workers.
+
+    Inputs:
+        shards: (list) shard i of the table of every chunk
+
+    Returns: the first shard, with the counts of the others added to it
+    '''
+
+    for other in shards[1:]:
+        shards[0].merge(other)
+
+    return shards[0]
+
+
+def create_hash_table_parallel(k, s, workers):
+    '''
+    Creates the hash table of a Markov model by splitting the string into
+    one chunk per worker and counting the chunks in a process pool. Shard i
+    of every chunk's table only holds keys that no other shard holds, so the
+    shards are merged in the pool as well, one task per shard.
+
+    Returns: the hash table and the number of characters used
+    '''
+
+    sps_k1 = s + s[:k+1]
+    size = max(-(-len(s) // workers), 1)
+    tasks = [(k, sps_k1[lo:lo+size+k+1], min(size, len(s) - lo), workers)
+             for lo in range(0, len(s), size)]
+
+    ht = Hash_Table.Sharded_Hash_Table(workers, HASH_CELLS)
+    if not tasks:
+        return (ht, 0)
+
+    with Pool(workers) as pool:
+        results = pool.map(count_chunk, tasks)
+        ht.shards = pool.map(merge_shards,
+                             [[other.shards[i] for (other, _) in results]
+                              for i in range(workers)])
+
+    chars_used = set()
+    for (_, chars) in results:
+        chars_used |= chars
+
+    return (ht, len(chars_used))
+
+
+class Incremental_Scorer:
+
+    def __init__(self,model,window=None):
+        '''
+        Construct a scorer that keeps the log probability under "model" of
+        the text appended to it so far, updating it in time proportional to
+        the appended text. With "window" set it also keeps the normalized log
+        probability of the last "window" characters.
+        '''
+
+        self.model = model
+        self.k = model.k
+        self.length = 0
+        self.head = ""
+        self.tail = ""
+        self.prob = 0
+
+        self.window = window
+        self.window_probs = deque()
+        self.window_sum = 0
+        self.window_count = 0
+
+
+    def append(self, text):
+        '''
+        Scores the characters in "text" following the text appended so far.
+        Only the last k characters before "text" are needed for this.
+        '''
+
+        k = self.k
+        gram_log_probability = self.model.gram_log_probability
+
+        if len(self.head) < k + 1:
+            self.head += text[:k + 1 - len(self.head)]
+        self.length += len(text)
+
+        sps = self.tail + text
+        for r in range(len(sps) - k):
+            prob = gram_log_probability(sps[r:r+k+1])
+            self.prob += prob
+            if self.window is not None:
+                self.add_to_window(prob)
+
+        self.tail = sps[max(len(sps) - k, 0):]
+
+
+    def add_to_window(self, prob):
+        '''
+        Adds the log probability of one character to the sliding window.
+        The running sum is recomputed every "window" characters, so rounding
+        errors do not build up.
+        '''
+
+        self.window_probs.append(prob)
+        self.window_sum += prob
+        if len(self.window_probs) > self.window:
+            self.window_sum -= self.window_probs.popleft()
+
+        self.window_count += 1
+        if self.window_count == self.window:
+            self.window_sum = math.fsum(self.window_probs)
+            self.window_count = 0
+
+
+    def log_probability(self):
+        '''
+        Get the log probability of all of the text appended so far, which is
+        the same as model.log_probability of that text. The last k characters
+        are scored against the start of the text, as in Markov.log_probability.
+        '''
+
+        k = self.k
+        gram_log_probability = self.model.gram_log_probability
+        prob = self.prob
+
+        sps = self.tail + self.head
+        for r in range(len(self.tail)):
+            prob += gram_log_probability(sps[r:r+k+1])
+
+        return prob
+
+
+    def window_likelihood(self):
+        '''
+        Get the log probability of the characters in the sliding window,
+        normalized by the number of characters (excluding the last k
+        characters, which are not scored until more text arrives).
+        '''
+
+        if len(self.window_probs) == 0:
+            return 0.0
+
+        return self.window_sum / len(self.window_probs)
+
+
+class Multi_Order_Markov:
+
+    def __init__(self,max_k,s,engine=PYTHON_ENGINE):
+        '''
+        Construct Markov models of every order 1..max_k for string "s" in a
+        single pass. The k-grams of all lengths 1..max_k+1 are counted into
+        one shared hash table: the grams of each position are the prefixes of
+        the longest one, and the (k+1)-grams of order k are the k-grams of
+        order k+1. The counts match those of Markov(k, s) as long as "s" and
+        the strings that are scored are longer than max_k.
+        '''
+
+        self.max_k = max_k
+        self.ht = Hash_Table.Compact_Hash_Table(HASH_CELLS, 0)
+
+        sps = s + s[:max_k+1]
+        lengths = range(1, max_k + 2)
+
+        if engine == NUMPY_ENGINE and len(s) > max_k:
+            import numpy as np
+            (codes, self.num_char_used) = encode_text(s)
+            count_grams_numpy(self.ht, sps,
+                              np.concatenate((codes, codes[:max_k+1])),
+                              len(s), list(lengths))
+        else:
+            chars_used = set()
+            for r in range(len(s)):
+                gram = sps[r:r+max_k+1]
+                chars_used.add(gram[0])
+                self.ht.increment_many(gram[:j] for j in lengths
+                                       if j <= len(gram))
+            self.num_char_used = len(chars_used)
+
+        self.models = [markov_from_table(k, self.ht, self.num_char_used)
+                       for k in range(1, max_k + 1)]
+
+
+    def get_model(self, k):
+        '''
+        Returns the order k Markov model, sharing the counts of this one.
+        The models are built once, so each keeps its cache of log
+        probabilities between calls.
+        '''
+
+        if k < 1 or k > self.max_k:
+            raise ValueError("order must be between 1 and " + str(self.max_k))
+
+        return self.models[k - 1]
+
+
+    def log_probability(self, s, k):
+        '''
+        Get the log probability of string "s" under the order k model.
+        '''
+
+        return self.get_model(k).log_probability(s)
+
+
+class Speaker_Identifier:
+
+    def __init__(self,speeches,order,engine=PYTHON_ENGINE):
+        '''
+        Construct one "order" order Markov model per sample text in the list
+        "speeches". The models are kept, so that any number of unidentified
+        texts can be scored against them.
+        '''
+
+        self.order = order
+        self.models = [Markov(order, speech, engine=engine)
+                       for speech in speeches]
+
+
+    def score(self, texts):
+        '''
+        Scores a list of unidentified texts against every speaker. The
+        k-grams and (k+1)-grams of each text are sliced once and looked up in
+        each model with one lookup_many call.
+
+        Inputs:
+            texts: (list) the M unidentified texts
+
+        Returns: an M x N list of lists of the *normalized* log
+            probabilities of each of the N speakers uttering each text, and a
+            list of the index of the most likely speaker for each text
+        '''
+
+        k = self.order
+        likelihoods = []
+
+        for text in texts:
+            sps_k1 = text + text[:k+1]
+            kgrams = [sps_k1[r:r+k] for r in range(len(text))]
+            k1grams = [sps_k1[r:r+k+1] for r in range(len(text))]
+
+            row = []
+            for model in self.models:
+                S = model.num_char_used
+                prob = sum(math.log((M+1)/(N+S)) for N, M in
+                           zip(model.ht.lookup_many(kgrams),
+                               model.ht.lookup_many(k1grams)))
+                row.append(prob / len(text))
+            likelihoods.append(row)
+
+        return (likelihoods, [row.index(max(row)) for row in likelihoods])
+
+
+def approximation_report(order, speeches, texts, memory_budget):
+    '''
+    Compares Markov models that keep their counts in a Count_Min_Sketch of
+    "memory_budget" bytes with exact ones.
+
+    Inputs:
+        order: (int) the order of the models
+        speeches: (list) the sample text of each speaker
+        texts: (list) the unidentified texts to score
+        memory_budget: (int) the number of bytes for each sketch
+
+    Returns: a dictionary with the mean and largest absolute difference of
+        the normalized log probabilities, the fraction of texts for which the
+        most likely speaker is the same, and the bytes used by the exact and
+        the approximate tables
+    '''
+
+    exact = [Markov(order, speech) for speech in speeches]
+    approx = [Markov(order, speech, memory_budget=memory_budget)
+              for speech in speeches]
+
+    drifts = []
+    agree = 0
+    for text in texts:
+        exact_probs = [m.log_probability(text)/len(text) for m in exact]
+        approx_probs = [m.log_probability(text)/len(text) for m in approx]
+        drifts.extend(abs(e - a) for e, a in zip(exact_probs, approx_probs))
+        if exact_probs.index(max(exact_probs)) == \
+        approx_probs.index(max(approx_probs)):
+            agree += 1
+
+    return {"mean_drift": sum(drifts) / len(drifts) if drifts else 0.0,
+            "max_drift": max(drifts) if drifts else 0.0,
+            "agreement": agree / len(texts) if texts else 1.0,
+            "exact_bytes": sum(m.ht.nbytes() for m in exact),
+            "approx_bytes": sum(m.ht.nbytes() for m in approx)}
+
+
+def markov_from_table(k, ht, num_char_used):
+    '''
+    Creates a k-order Markov model from an existing table of counts and the
+    number of characters used in the text that was counted.
+    '''
+
+    model = Markov(k, "")
+    model.ht = ht
+    model.num_char_used = num_char_used
+    model.log_prob_cache.clear()
+
+    return model
+
+
+def load_markov(filename):
+    '''
+    Opens a Markov model written by Markov.save. The counts (or the
+    sketch of a model with a memory budget) are read from the
+    memory-mapped file instead of being loaded into the process.
+    '''
+
+    ht = Hash_Table.open_table(filename)
+
+    return markov_from_table(ht.meta["k"], ht, ht.meta["num_char_used"])
+
+
+def read_chunks(filename, chunk_size=CHUNK_SIZE):
+    '''
+    Yields the text of a file in chunks of at most "chunk_size" characters.
+    '''
+
+    with open(filename) as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = f.read(chunk_size)
+
+
+def train_from_chunks(k, chunks, engine=PYTHON_ENGINE):
+    '''
+    Construct a k-order Markov model from an iterable of chunks of text,
+    with the same counts as Markov(k, "".join(chunks)) but without holding
+    more than one chunk in memory.
+
+    The last k characters of a chunk are carried over to the next one, so
+    that the grams that cross a chunk boundary are counted, and the first
+    k+1 characters of the text are kept to count the grams that wrap around
+    from the end of the text to its start.
+    '''
+
+    ht = Hash_Table.Compact_Hash_Table(HASH_CELLS, 0)
+    chars_used = set()
+    head = ""
+    pending = ""
+
+    for chunk in chunks:
+        if len(head) < k + 1:
+            head += chunk[:k + 1 - len(head)]
+
+        sps = pending + chunk
+        num_starts = max(len(sps) - k, 0)
+        if engine == NUMPY_ENGINE and num_starts > 0:
+            count_grams_numpy(ht, sps, encode_text(sps)[0], num_starts,
+                              [k, k+1])
+            chars_used.update(sps[:num_starts])
+        else:
+            chars_used |= count_grams(ht, sps, k, num_starts)
+        pending = sps[num_starts:]
+
+    chars_used |= count_grams(ht, pending + head, k, len(pending))
+
+    return markov_from_table(k, ht, len(chars_used))
+
+
 def identify_speaker(speech1, speech2, speech3, order):
     '''
     Given sample text from two speakers, and text from an unidentified speaker,
@@ -89,10 +654,20 @@ def identify_speaker(speech1, speech2, speech3, order):
     based on the two probabilities.
     '''
     
-    conslusion = ""
-
     speech1_markov = Markov(order, speech1)
     speech2_markov = Markov(order, speech2)
+
+    return compare_speakers(speech1_markov, speech2_markov, speech3)
+
+
+def compare_speakers(speech1_markov, speech2_markov, speech3):
+    '''
+    Given the Markov models of two speakers, and text from an unidentified
+    speaker, return the same tuple as identify_speaker.
+    '''
+    
+    conslusion = ""
+
     likelihood1 = speech1_markov.log_probability(speech3)/len(speech3)
     likelihood2 = speech2_markov.log_probability(speech3)/len(speech3)
 
@@ -132,16 +707,14 @@ if __name__=="__main__":
               "<order>")
         sys.exit(0)
     
-    with open(sys.argv[1], "rU") as file1:
-        speech1 = file1.read()
-
-    with open(sys.argv[2], "rU") as file2:
-        speech2 = file2.read()
+    order = int(sys.argv[4])
+    speech1_markov = train_from_chunks(order, read_chunks(sys.argv[1]))
+    speech2_markov = train_from_chunks(order, read_chunks(sys.argv[2]))
 
-    with open(sys.argv[3], "rU") as file3:
+    with open(sys.argv[3]) as file3:
         speech3 = file3.read()
 
-    res_tuple = identify_speaker(speech1, speech2, speech3, int(sys.argv[4]))
+    res_tuple = compare_speakers(speech1_markov, speech2_markov, speech3)
 
     print_results(res_tuple)
 
@@ -8,7 +8,7 @@ import json
 import string
 import sys
 import unicodedata
-from util import sort_count_pairs, grab_year_month, pretty_print_by_month, get_json_from_file
+from util import sort_count_pairs, grab_year_month, pretty_print_by_month
 from basic_algorithms import find_top_k, find_min_count, find_frequent
 
 ##################### DO NOT MODIFY THIS CODE ##################### 
@@ -38,22 +38,104 @@ STOP_PREFIXES  = ("@", "#", "http", "&amp")
 
 #####################  MODIFY THIS CODE ##################### 
 
-#Pre-processing Task
-def pre_process_tweets(tweets, n):
+# The months reported by task 7.
+MONTHS = [(2017, 4), (2017, 5), (2017, 6)]
+
+# Number of characters read from a tweet file at a time.
+READ_SIZE = 1 << 16
+
+# Number of characters a single tweet may take in a tweet file. A tweet
+# that does not decode within this many characters is reported as malformed
+# instead of reading more of the file.
+MAX_TWEET_SIZE = 1 << 24
+
+
+class TweetStream:
+
+    def __init__(self, filename):
+        '''
+        The tweets in a JSON file, read one at a time instead of loading the
+        whole file. The file can hold either one JSON array of tweets or one
+        tweet per line (newline-delimited JSON), and every tweet must be a
+        JSON object. The file is read again every time the stream is
+        iterated over.
+
+        Inputs:
+            filename: (string) the name of the file
+        '''
+
+        self.filename = filename
+
+
+    def __iter__(self):
+        '''
+        Generates the tweets in the file.
+        '''
+
+        decoder = json.JSONDecoder()
+
+        with open(self.filename) as f:
+            buffer = ""
+            pos = 0
+            at_end = False
+            in_array = None
+
+            while True:
+                while pos < len(buffer) and \
+                        (buffer[pos].isspace() or buffer[pos] == ","):
+                    pos += 1
+
+                if pos == len(buffer):
+                    if at_end:
+                        return
+                    buffer = f.read(READ_SIZE)
+                    pos = 0
+                    at_end = buffer == ""
+                    continue
+
+                if in_array is None:
+                    in_array = buffer[pos] == "["
+                    if in_array:
+                        pos += 1
+                    continue
+
+                if in_array and buffer[pos] == "]":
+                    return
+
+                # A partly read object never decodes, unlike a number, so
+                # only objects are decoded before all of their text is read.
+                if buffer[pos] != "{":
+                    raise json.JSONDecodeError("Expecting a tweet object",
+                                               buffer, pos)
+
+                try:
+                    (tweet, end) = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if at_end or len(buffer) - pos >= MAX_TWEET_SIZE:
+                        raise
+                    more = f.read(max(READ_SIZE, len(buffer) - pos))
+                    at_end = more == ""
+                    buffer = buffer[pos:] + more
+                    pos = 0
+                    continue
+
+                yield tweet
+                pos = end
+
+
+def iter_ngrams(tweets, n):
     '''
-    Pre-processes the tweets for tasks 4 and 5.
+    Generates the n-grams of the tweets for tasks 4 to 7.
 
     Inputs:
-        tweets: (list) list of tweets
+        tweets: (iterable) the tweets
         n: (int) the length of the ngrams
 
-    Returns: the processed list of tweets
+    Returns: generator of tuples of strings
     '''
-    l = range(len(tweets))
-    final_list = [] 
 
-    for i in l:
-        a = tweets[i]['text']
+    for tweet in tweets:
+        a = tweet['text']
         word_list = a.split()
         w_range = range(len(word_list))
         for w in w_range:
@@ -76,29 +158,42 @@ def pre_process_tweets(tweets, n):
         
         m = range(len(new_word_list) - (n - 1))
         for j in m:
-            final_list.append((tuple(new_word_list[j : j + n])))
+            yield tuple(new_word_list[j : j + n])
 
-    return final_list
+
+#Pre-processing Task
+def pre_process_tweets(tweets, n):
+    '''
+    Pre-processes the tweets for tasks 4 and 5.
+
+    Inputs:
+        tweets: (iterable) the tweets
+        n: (int) the length of the ngrams
+
+    Returns: the processed list of tweets
+    '''
+
+    return list(iter_ngrams(tweets, n))
 
 #Pre-processing Task 6
 def find_frequent_6(items, k):
     '''
     Find items where the number of times the item occurs is at least
-    1/k * len(items).
+    1/k * len(items). The items are read once, so they can come from a
+    generator.
 
     Input: 
-        items: list of items
+        items: iterable of items
         k: integer
 
     Returns: sorted list of tuples
     '''
    
-    N = len(items)
-    items_dict = {z : 0 for z in items}
+    items_dict = {}
     new_dict = {}
-    overall_dict = {z : 0 for z in items}
     
     for a in items:
+        items_dict.setdefault(a, 0)
         if a in new_dict:
             items_dict[a] += 1
         if a not in new_dict:
@@ -107,57 +202,23 @@ def find_frequent_6(items, k):
                 items_dict[a] += 1
             if len(new_dict) == k - 1:
                 items_dict[a] += 1
-                for b in new_dict:
+                for b in list(new_dict):
                     items_dict[b] -= 1
-                for b in overall_dict:
-                    if b in new_dict:
-                        if items_dict[b] == 0:
-                            del new_dict[b]
+                    if items_dict[b] == 0:
+                        del new_dict[b]
      
-    for a in overall_dict:
-        if items_dict[a] == 0:
-            del items_dict[a] 
-        
-    l = items_dict.items()
+    l = [(a, count) for (a, count) in items_dict.items() if count != 0]
 
     return sort_count_pairs(l)
 
 
-#Pre-processing Task 7
-def separate_monthly_tweets(tweets, n):
-    '''
-    Pre-processes the tweets for task 7.
-
-    Inputs:
-        tweets: (list) list of tweets
-        n: (int) the length of the ngrams
-
-    Returns: three lists of tweets separated by month
-    '''
-    l = range(len(tweets))
-    april_tweets = []
-    may_tweets = []
-    june_tweets = []
-
-    for i in l:
-        b = grab_year_month(tweets[i]['created_at'])
-        if b == (2017, 4):
-            april_tweets.append(tweets[i])
-        if b == (2017, 5):
-            may_tweets.append(tweets[i])
-        if b == (2017, 6):
-            june_tweets.append(tweets[i])
-
-    return april_tweets, may_tweets, june_tweets
-
-
 # Task 1
 def find_top_k_entities(tweets, entity_key, k):
     '''
     Find the K most frequently occuring entitites.
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         entity_key: a pair ("hashtags", "text"), 
           ("user_mentions", "screen_name"), etc
         k: integer
@@ -166,13 +227,9 @@ def find_top_k_entities(tweets, entity_key, k):
     '''
     z1, z2 = entity_key
     c = []
-    l = range(len(tweets))
     
-    for i in l:
-        a = tweets[i]['entities'][z1]
-        range_a = range(len(a))
-        for j in range_a:
-            b = a[j]
+    for tweet in tweets:
+        for b in tweet['entities'][z1]:
             c.append(b[z2])
 
     entity_list = [d.lower() for d in c]
@@ -186,7 +243,7 @@ def find_min_count_entities(tweets, entity_key, min_count):
     Find the entitites that occur at least min_count times.
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         entity_key: a pair ("hashtags", "text"), 
           ("user_mentions", "screen_name"), etc
         min_count: integer 
@@ -196,13 +253,9 @@ def find_min_count_entities(tweets, entity_key, min_count):
 
     z1, z2 = entity_key
     c = []
-    l = range(len(tweets))
 
-    for i in l:
-        a = tweets[i]['entities'][z1]
-        range_a = range(len(a))
-        for j in range_a:
-            b = a[j]
+    for tweet in tweets:
+        for b in tweet['entities'][z1]:
             c.append(b[z2])
 
     entity_list = [d.lower() for d in c]
@@ -217,7 +270,7 @@ def find_frequent_entities(tweets, entity_key, k):
     is at least fraction * the number of entities in across the tweets.
 
     Input: 
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         entity_key: a pair ("hashtags", "text"), 
           ("user_mentions", "screen_name"), etc
         k: integer
@@ -227,13 +280,9 @@ def find_frequent_entities(tweets, entity_key, k):
 
     z1, z2 = entity_key
     c = []
-    l = range(len(tweets))
 
-    for i in l:
-        a = tweets[i]['entities'][z1]
-        range_a = range(len(a))
-        for j in range_a:
-            b = a[j]
+    for tweet in tweets:
+        for b in tweet['entities'][z1]:
             c.append(b[z2])
 
     entity_list = [d.lower() for d in c]
@@ -247,7 +296,7 @@ def find_top_k_ngrams(tweets, n, k):
     Find k most frequently occurring n-grams
     
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         n: integer
         k: integer
 
@@ -265,7 +314,7 @@ def find_min_count_ngrams(tweets, n, min_count):
     Find n-grams that occur at least min_count times.
     
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         n: integer
         min_count: integer
 
@@ -284,16 +333,14 @@ def find_frequent_ngrams(tweets, n, k):
     Find frequently occurring n-grams
 
     Inputs:
-        tweets: a list of tweets
+        tweets: an iterable of tweets
         n: integer
         k: integer
 
     Returns: list of ngram/value pairs
     '''
 
-    final_list = pre_process_tweets(tweets, n)
-
-    return find_frequent_6(final_list, k)
+    return find_frequent_6(iter_ngrams(tweets, n), k)
 
 
 # Task 7
@@ -303,7 +350,7 @@ def find_top_k_ngrams_by_month(tweets, n, k):
     Find the top k ngrams for each month.
 
     Inputs:
-        tweets: list of tweet dictionaries
+        tweets: iterable of tweet dictionaries
         n: integer
         k: integer
 
@@ -311,19 +358,17 @@ def find_top_k_ngrams_by_month(tweets, n, k):
         ((year,  month), (sorted top-k n-grams for that month with their counts))
     '''
 
+    monthly_ngrams = {}
+
+    for tweet in tweets:
+        b = grab_year_month(tweet['created_at'])
+        if b in MONTHS:
+            monthly_ngrams.setdefault(b, []).extend(iter_ngrams([tweet], n))
+
     final_list = []
-    april_tweets, may_tweets, june_tweets = separate_monthly_tweets(tweets, n)
-
-    april = ((2017, 4), (find_top_k_ngrams(april_tweets, n, k)))
-    may = ((2017, 5), (find_top_k_ngrams(may_tweets, n, k)))
-    june = ((2017, 6), (find_top_k_ngrams(june_tweets, n, k)))
-
-    if len(april_tweets) > 0:
-        final_list.append((april))
-    if len(may_tweets) > 0:
-        final_list.append((may))
-    if len(june_tweets) > 0:
-        final_list.append((june))
+    for month in MONTHS:
+        if month in monthly_ngrams:
+            final_list.append((month, find_top_k(monthly_ngrams[month], k)))
     
     return final_list
 
@@ -356,7 +401,7 @@ def parse_args(args):
                         help="entity key for task 1", 
                         type=str, default=["hashtags"])
     parser.add_argument('file', nargs=1, 
-                        help='name of JSON file with tweets')
+                        help='name of JSON file with tweets (an array or one per line)')
 
     try:
         return parser.parse_args(args[1:])
@@ -390,7 +435,7 @@ def go(args):
             sys.exit(1)
         entity_type = (args.entity_key[0], ek2vk.get(ek, ""))
 
-    tweets = get_json_from_file(args.file[0])
+    tweets = TweetStream(args.file[0])
 
     if task == 1:
         print(find_top_k_entities(tweets, entity_type, args.k[0]))
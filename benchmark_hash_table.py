@@ -0,0 +1,407 @@
+# CS122 W'18: Markov models and hash tables
+# Benchmarks for Hash_Table
+#
+# Kyle Pinder
+
+import argparse
+import gc
+import itertools
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+import Hash_Table
+
+HASH_CELLS = 57
+KEY_LENGTH = 8
+KGRAM_ORDER = 4
+LOAD_SAMPLES = 10
+
+# SUM_HASH only has a few hundred distinct values for short lowercase keys
+# (every anagram key has the same one), so the SUM_HASH table probes through
+# most of the keys before it on every operation. It only gets this many of
+# them, whatever the distribution, so that the benchmarks finish.
+SUM_HASH_KEYS = 1000
+
+
+def random_keys(num_keys, key_length=KEY_LENGTH, seed=0):
+    '''
+    Creates a list of random lowercase strings.
+
+    Inputs:
+        num_keys: (int) the number of keys
+        key_length: (int) the length of each key
+        seed: (int) the seed for the random number generator
+
+    Returns: list of strings
+    '''
+
+    rng = random.Random(seed)
+
+    return ["".join(rng.choice(string.ascii_lowercase)
+                    for _ in range(key_length)) for _ in range(num_keys)]
+
+
+def kgram_keys(text, num_keys, k=KGRAM_ORDER):
+    '''
+    Creates the list of k-grams and (k+1)-grams that a Markov model counts
+    for the text, repeating the text if it is too short.
+
+    Inputs:
+        text: (string) the text
+        num_keys: (int) the number of keys
+        k: (int) the order of the Markov model
+
+    Returns: list of strings
+    '''
+
+    keys = []
+    sps_k1 = text + text[:k+1]
+    r = 0
+
+    while len(keys) < num_keys:
+        keys.append(sps_k1[r:r+k])
+        keys.append(sps_k1[r:r+k+1])
+        r = (r + 1) % len(text)
+
+    return keys[:num_keys]
+
+
+def anagram_keys(num_keys, key_length=KEY_LENGTH + 2):
+    '''
+    Creates distinct keys that are all permutations of the same characters,
+    so that they have the same character sum (the worst case for SUM_HASH).
+
+    Inputs:
+        num_keys: (int) the number of keys
+        key_length: (int) the length of each key
+
+    Returns: list of strings
+    '''
+
+    letters = string.ascii_lowercase[:key_length]
+
+    return ["".join(p) for p in itertools.islice(
+        itertools.permutations(letters), num_keys)]
+
+
+class Dict_Table:
+
+    def __init__(self,cells,defval):
+        '''
+        A plain dict behind the Hash_Table interface, used as the baseline.
+        '''
+
+        self.defval = defval
+        self.data = {}
+
+
+    def lookup(self,key):
+        '''
+        Retrieve the value associated with the key, or the default value.
+        '''
+
+        return self.data.get(key, self.defval)
+
+
+    def update(self,key,val):
+        '''
+        Change the value associated with the key.
+        '''
+
+        self.data[key] = val
+
+
+# (label, function that creates the table, largest number of keys)
+TABLES = [("dict", lambda: Dict_Table(HASH_CELLS, 0), None),
+          ("Hash_Table sum", lambda: Hash_Table.Hash_Table(HASH_CELLS, 0),
+           SUM_HASH_KEYS),
+          ("Hash_Table fnv", lambda: Hash_Table.Hash_Table(
+              HASH_CELLS, 0, Hash_Table.FNV_HASH), None),
+          ("Compact_Hash_Table", lambda: Hash_Table.Compact_Hash_Table(
+              HASH_CELLS, 0), None)]
+
+
+def percentile(values, p):
+    '''
+    Finds the p-th percentile of a list of numbers (nearest rank).
+
+    Inputs:
+        values: (list) the numbers
+        p: (float) the percentile, between 0 and 100
+
+    Returns: float
+    '''
+
+    if len(values) == 0:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = max(int(round(p / 100 * len(ordered))) - 1, 0)
+
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def histogram_percentile(histogram, p):
+    '''
+    Finds the p-th percentile of the values counted in a histogram that
+    maps a value to the number of times it occurs.
+    '''
+
+    total = sum(histogram.values())
+    needed = p / 100 * total
+    seen = 0
+
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= needed:
+            return value
+
+    return 0
+
+
+def ops_per_second(fn, items):
+    '''
+    Calls fn on every item and returns the number of calls per second.
+    '''
+
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    elapsed = time.perf_counter() - start
+
+    return len(items) / elapsed if elapsed > 0 else float("inf")
+
+
+def fill(table, keys):
+    '''
+    Counts the keys in the table the way Markov used to (a lookup then an
+    update) and samples the load factor LOAD_SAMPLES times along the way.
+
+    Returns: list of (number of updates, load factor) pairs
+    '''
+
+    loads = []
+    every = max(len(keys) // LOAD_SAMPLES, 1)
+
+    for i, key in enumerate(keys):
+        table.update(key, table.lookup(key) + 1)
+        if hasattr(table, "cells") and (i + 1) % every == 0:
+            loads.append((i + 1, table.check_size / table.cells))
+
+    return loads
+
+
+def memory_per_entry(make_table, keys):
+    '''
+    Measures the bytes allocated by a table per distinct key. Key strings
+    that the table shares with the caller are not counted.
+    '''
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = make_table()
+    fill(table, keys)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / max(len(set(keys)), 1)
+
+
+def benchmark_table(make_table, keys):
+    '''
+    Measures one kind of table on a list of keys.
+
+    Inputs:
+        make_table: (function) creates an empty table
+        keys: (list) the keys to count
+
+    Returns: dictionary of results
+    '''
+
+    table = make_table()
+    start = time.perf_counter()
+    loads = fill(table, keys)
+    elapsed = time.perf_counter() - start
+    results = {"update": len(keys) / elapsed if elapsed > 0 else float("inf"),
+               "lookup": ops_per_second(table.lookup, keys),
+               "memory": memory_per_entry(make_table, keys),
+               "loads": loads}
+
+    if isinstance(table, Hash_Table.Hash_Table):
+        results["find_slot"] = ops_per_second(
+            lambda key: table.find_slot(key, table.create_hash(key)), keys)
+    elif isinstance(table, Hash_Table.Compact_Hash_Table):
+        results["find_slot"] = ops_per_second(
+            lambda key: table.find_slot(key, Hash_Table.fnv_hash(key)), keys)
+
+    # The probe lengths come from the table the workload produced, before
+    # the rehash halves its load factor.
+    if hasattr(table, "probe_histogram"):
+        histogram = table.probe_histogram()
+        results["probes"] = [histogram_percentile(histogram, p)
+                             for p in [50, 90, 99, 100]]
+
+    if hasattr(table, "rehash"):
+        start = time.perf_counter()
+        table.rehash()
+        results["rehash"] = time.perf_counter() - start
+
+    return results
+
+
+def print_results(label, results):
+    '''
+    Prints the results of benchmark_table.
+    '''
+
+    print(label)
+    print("  ops/sec: update {:.0f}, lookup {:.0f}, find_slot {}".format(
+        results["update"], results["lookup"],
+        "{:.0f}".format(results["find_slot"]) if "find_slot" in results
+        else "-"))
+    print("  memory per entry: {:.1f} bytes".format(results["memory"]))
+    if "rehash" in results:
+        print("  rehash: {:.2f} ms".format(results["rehash"] * 1e3))
+    if "probes" in results:
+        print("  probe length p50/p90/p99/max: {}/{}/{}/{}".format(
+            *results["probes"]))
+    if results["loads"]:
+        print("  load factor: " + " ".join("{:.2f}".format(load)
+                                           for (_, load) in results["loads"]))
+    print("")
+
+
+def update_latencies(table, keys):
+    '''
+    Times every update of a hash table while the keys are inserted. The
+    garbage collector is paused meanwhile, so that its pauses are not
+    counted as update latency.
+
+    Inputs:
+        table: (Hash_Table) the table to fill
+        keys: (list) the keys to insert
+
+    Returns: list of the latencies of each update in seconds
+    '''
+
+    latencies = []
+    clock = time.perf_counter
+
+    gc.disable()
+    try:
+        for key in keys:
+            start = clock()
+            table.update(key, 1)
+            latencies.append(clock() - start)
+    finally:
+        gc.enable()
+
+    return latencies
+
+
+def latency_by_growth(latencies):
+    '''
+    Splits the update latencies into segments that double in size (the
+    table doubles at about the same rate) and summarizes each segment.
+
+    Inputs:
+        latencies: (list) latencies of consecutive updates
+
+    Returns: list of (number of keys, p50, p99, max) tuples
+    '''
+
+    summary = []
+    lo = 0
+    hi = HASH_CELLS
+
+    while lo < len(latencies):
+        segment = latencies[lo:hi]
+        summary.append((min(hi, len(latencies)), percentile(segment, 50),
+                        percentile(segment, 99), max(segment)))
+        lo = hi
+        hi *= 2
+
+    return summary
+
+
+def print_latencies(label, summary):
+    '''
+    Prints the table of latency_by_growth results (in microseconds).
+    '''
+
+    print(label)
+    print("{:>10} {:>10} {:>10} {:>12}".format("keys", "p50", "p99", "max"))
+    for (num_keys, p50, p99, worst) in summary:
+        print("{:>10} {:>10.2f} {:>10.2f} {:>12.2f}".format(
+            num_keys, p50 * 1e6, p99 * 1e6, worst * 1e6))
+    print("")
+
+
+def parse_args(args):
+    '''
+    Parse the arguments
+
+    Inputs:
+        args: list of strings
+
+    Result: parsed argument object.
+    '''
+
+    s = 'Benchmark the Hash_Table used by the Markov models.'
+    parser = argparse.ArgumentParser(description=s)
+    parser.add_argument('-n', '--num_keys', nargs=1,
+                        help="number of keys to insert",
+                        type=int, default=[200000])
+    parser.add_argument('-d', '--distribution', nargs=1,
+                        help="keys to use: kgram, random or anagram",
+                        type=str, default=["random"])
+    parser.add_argument('-f', '--file', nargs=1,
+                        help="text to take the k-grams from",
+                        type=str, default=[None])
+    parser.add_argument('-l', '--latency', action="store_true",
+                        help="measure the update latency while the table grows")
+
+    return parser.parse_args(args[1:])
+
+
+def go(args):
+    '''
+    Runs the benchmarks for the key distribution given in the arguments.
+    '''
+
+    num_keys = args.num_keys[0]
+    distribution = args.distribution[0]
+
+    if distribution == "kgram":
+        if args.file[0] is None:
+            print("The kgram distribution needs a text file.", file=sys.stderr)
+            sys.exit(1)
+        with open(args.file[0]) as f:
+            keys = kgram_keys(f.read(), num_keys)
+    elif distribution == "anagram":
+        keys = anagram_keys(num_keys)
+    else:
+        keys = random_keys(num_keys)
+
+    if args.latency:
+        for incremental in [False, True]:
+            table = Hash_Table.Hash_Table(HASH_CELLS, 0, Hash_Table.FNV_HASH,
+                                          incremental)
+            label = "incremental resize" if incremental else "full rehash"
+            print_latencies(label, latency_by_growth(update_latencies(table,
+                                                                      keys)))
+        return
+
+    for (label, make_table, max_keys) in TABLES:
+        if max_keys is not None and len(keys) > max_keys:
+            label += " (first {} keys only)".format(max_keys)
+            print_results(label, benchmark_table(make_table, keys[:max_keys]))
+        else:
+            print_results(label, benchmark_table(make_table, keys))
+
+
+if __name__ == "__main__":
+    go(parse_args(sys.argv))
@@ -9,28 +9,71 @@
 #
 # Kyle Pinder
 
+import heapq
+import itertools
+import mmap
 import os
+import struct
 import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
 from sys import exit
 
 import autocorrect_shell
 
+# A compiled dictionary image is the header (magic, number of nodes)
+# followed by the arrays of a CompactTrie: labels, first_child and
+# node_count as 4-byte integers, then node_completion as bytes.
+IMAGE_MAGIC = b"TRIE0001"
+IMAGE_HEADER = struct.Struct("=8sq")
+
+# Number of ranked completions cached at each node when a dictionary is
+# loaded with word frequencies (see EnglishDictionary.top_completions).
+TOP_K = 10
+
 
 class EnglishDictionary(object):
-    def __init__(self, wordfile):
+    def __init__(self, wordfile, compact=False, freqfile=None, top_k=None):
         '''
         Constructor
 
         Inputs:
-          wordfile (string): name of the file with the words.
+          wordfile (string): name of the file with the words, or of a
+            dictionary image made by compile_dictionary, which is mapped
+            into memory instead of being read.
+          compact (boolean): store the words in a CompactTrie instead of
+            a trie of TrieNodes.
+          freqfile (string): name of a file with one "word frequency" line
+            per word, used to rank completions (words that are not in it
+            have frequency 0).
+          top_k (int): the number of ranked completions to cache at each
+            node (0 for none, see top_completions). The default is TOP_K
+            when freqfile is given and 0 otherwise.
         '''
-        self.words = TrieNode()
+        self.frequencies = {}
+        if freqfile is not None:
+            self.frequencies = read_frequencies(freqfile)
+        if top_k is None:
+            top_k = TOP_K if freqfile is not None else 0
+        self.top_k = top_k
+
+        if is_image(wordfile):
+            self.words = load_compact_trie(wordfile)
+        elif compact:
+            with open(wordfile) as f:
+                self.words = build_compact_trie(w.strip() for w in f)
+        else:
+            self.words = TrieNode()
+
+            with open(wordfile) as f:
+                for w in f:
+                    w = w.strip()
+                    if w != "":                   
+                        self.words.add_word(w)
 
-        with open(wordfile) as f:
-            for w in f:
-                w = w.strip()
-                if w != "" and not self.is_word(w):                   
-                    self.words.add_word(w)
+        if top_k > 0:
+            self.words.build_top_completions(top_k, self.frequencies)
 
 
     def is_word(self, w):
@@ -57,12 +100,21 @@ class EnglishDictionary(object):
 
         Returns: int
         '''
-        completions = self.words.search_word(prefix, "Count")
+        return self.words.count_completions(prefix)
 
-        if completions == []:
-            return 0
-        
-        return completions[0]
+
+    def num_completions_many(self, prefixes):
+        '''
+        How many words in the dictionary start with each of the specified
+        prefixes? The prefixes are visited in sorted order, so the walk
+        down the trie is shared by prefixes with a common beginning.
+
+        Inputs:
+          prefixes (list of strings): the prefixes
+
+        Returns: list of ints, in the order of the prefixes.
+        '''
+        return self.words.count_completions_many(prefixes)
 
 
     def get_completions(self, prefix):
@@ -79,6 +131,69 @@ class EnglishDictionary(object):
         return self.words.search_word(prefix, "Completions")
 
 
+    def iter_completions(self, prefix, limit=None, after=None):
+        '''
+        Generate the suffixes in the dictionary of words that start with
+        the specified prefix, lazily and in lexicographic order.
+
+        A page of completions is read by passing its last suffix as the
+        "after" of the next call.
+
+        Inputs:
+          prefix (string): the prefix
+          limit (int): the largest number of suffixes (None for all)
+          after (string): only generate the suffixes that come after it
+
+        Returns: generator of strings.
+        '''
+        return itertools.islice(self.words.iter_completions(prefix, after),
+                                limit)
+
+
+    def top_completions(self, prefix, k):
+        '''
+        Get the suffixes of the k most frequent words that start with the
+        specified prefix, most frequent first (ties in alphabetical order).
+
+        When k is at most the top_k given to the constructor, the answer is
+        the list cached at the node of the prefix, so it takes time
+        proportional to the length of the prefix; otherwise every
+        completion is ranked.
+
+        Inputs:
+          prefix (string): the prefix
+          k (int): the number of completions
+
+        Returns: list of strings.
+        '''
+        if k <= self.top_k:
+            ranked = self.words.get_top_completions(prefix)[:k]
+        else:
+            ranked = heapq.nsmallest(k, (
+                (-self.frequencies.get(prefix + suffix, 0), prefix + suffix)
+                for suffix in self.get_completions(prefix)))
+
+        return [word[len(prefix):] for (_, word) in ranked]
+
+
+    def get_corrections(self, w, max_distance=1):
+        '''
+        Get the words in the dictionary that are at most max_distance
+        edits (insertions, deletions or substitutions of one character)
+        away from the specified string.
+
+        Inputs:
+          w (string): the (possibly misspelled) word
+          max_distance (int): the largest number of edits
+
+        Returns: list of strings, closest first (ties in alphabetical
+          order).
+        '''
+        matches = self.words.search_fuzzy(w, max_distance)
+
+        return [word for (_, word) in sorted(matches)]
+
+
 class TrieNode(object):
     def __init__(self):
         '''
@@ -87,40 +202,45 @@ class TrieNode(object):
         self.node_count = 0
         self.node_completion = False 
         self.node_children = {}
+        self.node_top = None
 
 
     def add_word(self, word):
         '''
-        Adds a word to the trie.
+        Adds a word to the trie. Adding a word that is already in the trie
+        does not change it.
 
         Inputs:
             word: (string) The word that is added to the trie.
 
         Returns: No explicit output; adds the word to the trie.
         '''        
-        if len(word) == 0:
-            self.node_completion = True
-            self.node_count += 1
+        path = [self]
+        node = self
+        for key in word:
+            child = node.node_children.get(key)
+            if child is None:
+                child = TrieNode()
+                node.node_children[key] = child
+            node = child
+            path.append(node)
+
+        if node.node_completion:
             return
 
-        key = word[0]
-        word = word[1:]
-               
-        if key in self.node_children:               
-            self.node_children[key].add_word(word)
-            self.node_count += 1
-           
-        else:
-            trienode = TrieNode()
-            self.node_children[key] = trienode
-            trienode.add_word(word)
-            self.node_count += 1
+        node.node_completion = True
+        for node in path:
+            node.node_count += 1
         
 
     def get_suffix(self, prefix=None, prefix_length=0):
         '''
         Creates the possible suffixes of the given prefix.
 
+        The trie is walked with an explicit stack, and the characters after
+        the prefix are kept in one buffer that is cut back to the depth of
+        each node, so no string is built until a word is found.
+
         Inputs:
             prefix: (string) The given prefix.
             prefix_length: (int) The length of the given prefix.
@@ -128,20 +248,63 @@ class TrieNode(object):
         Returns: The list of suffixes.
         '''
         word_sublist = []
-
-        if self.node_children.keys() == []:
-            return
-
-        if self.node_completion:
-            word_sublist.append(prefix[prefix_length:])
-        for key in self.node_children:
-            word_sublist.extend(self.node_children[key].get_suffix\
-            (prefix + key, prefix_length))
+        buffer = list(prefix[prefix_length:])
+        base = len(buffer)
+        stack = [(self, 0, None)]
+
+        while stack:
+            (node, depth, key) = stack.pop()
+            if depth > 0:
+                del buffer[base + depth - 1:]
+                buffer.append(key)
+            if node.node_completion:
+                word_sublist.append("".join(buffer))
+            for child_key in reversed(node.node_children):
+                stack.append((node.node_children[child_key], depth + 1,
+                              child_key))
 
         return word_sublist
         
 
-    def search_word(self, word, action="Find", word_list=[], 
+    def iter_completions(self, word, after=None):
+        '''
+        Generates the suffixes of the words below the node of the given
+        word in lexicographic order, walking the trie with an explicit
+        stack. While the path to a node is a prefix of "after", the
+        children that come before the next character of "after" are
+        skipped, so resuming does not visit the pages already read.
+
+        Inputs:
+            word: (string) The given word.
+            after: (string) Only suffixes that come after it are generated.
+
+        Returns: generator of strings.
+        '''
+        node = self.find_node(word)
+        if node is None:
+            return
+
+        buffer = []
+        stack = [(node, 0, None, after is not None)]
+
+        while stack:
+            (node, depth, key, on_cursor) = stack.pop()
+            if depth > 0:
+                del buffer[depth - 1:]
+                buffer.append(key)
+            if node.node_completion and not on_cursor:
+                yield "".join(buffer)
+            for child_key in sorted(node.node_children, reverse=True):
+                child_on_cursor = on_cursor and depth < len(after)
+                if child_on_cursor:
+                    if child_key < after[depth]:
+                        continue
+                    child_on_cursor = child_key == after[depth]
+                stack.append((node.node_children[child_key], depth + 1,
+                              child_key, child_on_cursor))
+
+
+    def search_word(self, word, action="Find", word_list=None, 
         current_prefix=""):
         '''
         Creates a list based on the required action and the given word.
@@ -150,45 +313,594 @@ class TrieNode(object):
             word: (string) The given word.
             action: (string) The action necessary for each task 
                     (either Find, Count, or Completions).
-            word_list: Initiates the list that is later returned.
-            current_prefix: The prefix that is currently being used
-                            for the task.
+            word_list: The list that is filled in and returned (a new
+                       list if not given).
+            current_prefix: The prefix that leads to this node.
 
         Returns: A list based on the required action and the given word.
 
         '''
-        if len(word) > 0:
-            key = word[0]
-            word = word[1:]
+        if word_list is None:
+            word_list = []
 
-            if key in self.node_children:
-                current_prefix += key
-                self.node_children[key].search_word\
-                (word, action, word_list, current_prefix)
-
-            else:
+        node = self
+        for key in word:
+            node = node.node_children.get(key)
+            if node is None:
                 word_list[:] = []
                 return word_list
 
-        else:
-            word_list[:] = []
-            if action == "Count":
-                word_list.append(self.node_count)
-  
-            elif action == "Find":
-                if self.node_completion:
-                    word_list.append(current_prefix)
-
-            elif action == "Completions":
-                prefix_length = len(current_prefix)                
-                if self.node_completion:
-                    word_list.append(current_prefix[prefix_length:])                
-                for key in self.node_children:
-                    word_list.extend(self.node_children[key].get_suffix\
-                    (current_prefix + key, prefix_length))                                   
+        current_prefix += word
+        word_list[:] = []
+        if action == "Count":
+            word_list.append(node.node_count)
+
+        elif action == "Find":
+            if node.node_completion:
+                word_list.append(current_prefix)
+
+        elif action == "Completions":
+            word_list.extend(node.get_suffix(current_prefix,
+                                             len(current_prefix)))
 
         return word_list
+
+
+    def build_top_completions(self, k, frequencies):
+        '''
+        Caches at every node the k most frequent words below it, as
+        (-frequency, word) pairs in ranked order. The nodes are visited
+        after their children, so the list of a node is merged from the
+        lists of its children.
+
+        Inputs:
+            k: (int) The number of words kept at each node.
+            frequencies: (dict) The frequency of each word.
+        '''
+        stack = [(self, "", False)]
+
+        while stack:
+            (node, prefix, merge) = stack.pop()
+            if not merge:
+                stack.append((node, prefix, True))
+                for key, child in node.node_children.items():
+                    stack.append((child, prefix + key, False))
+                continue
+
+            ranked = []
+            if node.node_completion:
+                ranked.append((-frequencies.get(prefix, 0), prefix))
+            for child in node.node_children.values():
+                ranked.extend(child.node_top)
+            node.node_top = heapq.nsmallest(k, ranked)
+
+
+    def find_node(self, word):
+        '''
+        Finds the node reached by following the characters of a word.
+
+        Inputs:
+            word: (string) The given word.
+
+        Returns: the TrieNode, or None if there is no such node.
+        '''
+        node = self
+        for key in word:
+            node = node.node_children.get(key)
+            if node is None:
+                return None
+
+        return node
+
+
+    def count_completions(self, word):
+        '''
+        Returns the number of words in the trie that start with the given
+        word.
+        '''
+        node = self.find_node(word)
+
+        return 0 if node is None else node.node_count
+
+
+    def count_completions_many(self, words):
+        '''
+        Returns the number of words in the trie that start with each of the
+        given words (see count_prefixes).
+        '''
+        return count_prefixes(words, self,
+                              lambda node, key: node.node_children.get(key),
+                              lambda node: node.node_count)
+
+
+    def get_top_completions(self, word):
+        '''
+        Returns the list cached by build_top_completions at the node of the
+        given word (an empty list if there is no such node).
+        '''
+        node = self.find_node(word)
+
+        if node is None or node.node_top is None:
+            return []
+
+        return node.node_top
+
+
+    def search_fuzzy(self, word, max_distance):
+        '''
+        Finds the words in the trie within an edit distance of the given
+        word. Each node is visited with the row of the Levenshtein table
+        for the prefix leading to it, and the children of a node are not
+        visited when every entry of its row is above max_distance.
+
+        Inputs:
+            word: (string) The given word.
+            max_distance: (int) The largest edit distance.
+
+        Returns: list of (distance, word) pairs.
+        '''
+        matches = []
+        stack = [(self, "", list(range(len(word) + 1)))]
+
+        while stack:
+            (node, prefix, row) = stack.pop()
+            if node.node_completion and row[-1] <= max_distance:
+                matches.append((row[-1], prefix))
+            if min(row) > max_distance:
+                continue
+            for key, child in node.node_children.items():
+                stack.append((child, prefix + key, next_row(row, word, key)))
+
+        return matches
           
 
+class CompactTrie(object):
+    def __init__(self, labels, first_child, node_count, node_completion):
+        '''
+        Constructor (use build_compact_trie to create a CompactTrie from a
+        list of words).
+
+        The nodes are numbered in breadth-first order, so the children of
+        each node are consecutive and sorted by their character, and the
+        trie is stored as flat arrays indexed by node number instead of one
+        object and dictionary per node.
+
+        Inputs:
+            labels: (array) the character (code point) leading to each node
+            first_child: (array) the number of the first child of each node,
+                plus one extra entry; the children of node i are the nodes
+                first_child[i] to first_child[i + 1] - 1
+            node_count: (array) the number of words through each node
+            node_completion: (array) 1 if a word ends at the node, else 0
+        '''
+        self.labels = labels
+        self.first_child = first_child
+        self.node_count = node_count
+        self.node_completion = node_completion
+        self.node_top = None
+
+
+    def find_node(self, word):
+        '''
+        Finds the node reached by following the characters of a word.
+
+        Inputs:
+            word: (string) The given word.
+
+        Returns: the number of the node, or -1 if there is no such node.
+        '''
+        node = 0
+        for char in word:
+            node = self.find_child(node, char)
+            if node is None:
+                return -1
+
+        return node
+
+
+    def find_child(self, node, char):
+        '''
+        Finds the child of a node reached by a character.
+
+        Inputs:
+            node: (int) The number of the node.
+            char: (string) The character.
+
+        Returns: the number of the child, or None if there is no such child.
+        '''
+        lo = self.first_child[node]
+        hi = self.first_child[node + 1]
+        label = ord(char)
+        child = bisect_left(self.labels, label, lo, hi)
+        if child == hi or self.labels[child] != label:
+            return None
+
+        return child
+
+
+    def count_completions(self, word):
+        '''
+        Returns the number of words in the trie that start with the given
+        word.
+        '''
+        node = self.find_node(word)
+
+        return 0 if node == -1 else self.node_count[node]
+
+
+    def count_completions_many(self, words):
+        '''
+        Returns the number of words in the trie that start with each of the
+        given words (see count_prefixes).
+        '''
+        return count_prefixes(words, 0, self.find_child,
+                              self.node_count.__getitem__)
+
+
+    def get_suffix(self, node):
+        '''
+        Creates the suffixes of the words below a node, in lexicographic
+        order.
+
+        Inputs:
+            node: (int) The number of the node.
+
+        Returns: The list of suffixes.
+        '''
+        word_sublist = []
+        stack = [(node, 0)]
+        buffer = []
+
+        while stack:
+            (node, depth) = stack.pop()
+            if depth > 0:
+                del buffer[depth - 1:]
+                buffer.append(chr(self.labels[node]))
+            if self.node_completion[node]:
+                word_sublist.append("".join(buffer))
+            for child in range(self.first_child[node + 1] - 1,
+                               self.first_child[node] - 1, -1):
+                stack.append((child, depth + 1))
+
+        return word_sublist
+
+
+    def iter_completions(self, word, after=None):
+        '''
+        Generates the suffixes of the words below the node of the given
+        word in lexicographic order, in the same way as
+        TrieNode.iter_completions.
+
+        Inputs:
+            word: (string) The given word.
+            after: (string) Only suffixes that come after it are generated.
+
+        Returns: generator of strings.
+        '''
+        node = self.find_node(word)
+        if node == -1:
+            return
+
+        buffer = []
+        stack = [(node, 0, after is not None)]
+
+        while stack:
+            (node, depth, on_cursor) = stack.pop()
+            if depth > 0:
+                del buffer[depth - 1:]
+                buffer.append(chr(self.labels[node]))
+            if self.node_completion[node] and not on_cursor:
+                yield "".join(buffer)
+            for child in range(self.first_child[node + 1] - 1,
+                               self.first_child[node] - 1, -1):
+                child_on_cursor = on_cursor and depth < len(after)
+                if child_on_cursor:
+                    label = ord(after[depth])
+                    if self.labels[child] < label:
+                        break
+                    child_on_cursor = self.labels[child] == label
+                stack.append((child, depth + 1, child_on_cursor))
+
+
+    def search_word(self, word, action="Find"):
+        '''
+        Creates a list based on the required action and the given word, in
+        the same way as TrieNode.search_word.
+
+        Inputs:
+            word: (string) The given word.
+            action: (string) The action necessary for each task
+                    (either Find, Count, or Completions).
+
+        Returns: A list based on the required action and the given word.
+        '''
+        node = self.find_node(word)
+        if node == -1:
+            return []
+
+        if action == "Count":
+            return [self.node_count[node]]
+
+        elif action == "Find":
+            return [word] if self.node_completion[node] else []
+
+        return self.get_suffix(node)
+
+
+    def build_top_completions(self, k, frequencies):
+        '''
+        Caches for every node the k most frequent words below it, in the
+        same way as TrieNode.build_top_completions. The nodes are in
+        breadth-first order, so going through them backwards merges the
+        lists of the children before their parent.
+
+        Inputs:
+            k: (int) The number of words kept at each node.
+            frequencies: (dict) The frequency of each word.
+        '''
+        num_nodes = len(self.labels)
+        words = [""] * num_nodes
+        for node in range(num_nodes):
+            for child in range(self.first_child[node],
+                               self.first_child[node + 1]):
+                words[child] = words[node] + chr(self.labels[child])
+
+        node_top = [None] * num_nodes
+        for node in range(num_nodes - 1, -1, -1):
+            ranked = []
+            if self.node_completion[node]:
+                ranked.append((-frequencies.get(words[node], 0), words[node]))
+            for child in range(self.first_child[node],
+                               self.first_child[node + 1]):
+                ranked.extend(node_top[child])
+            node_top[node] = heapq.nsmallest(k, ranked)
+
+        self.node_top = node_top
+
+
+    def get_top_completions(self, word):
+        '''
+        Returns the list cached by build_top_completions for the node of the
+        given word (an empty list if there is no such node).
+        '''
+        node = self.find_node(word)
+        if node == -1 or self.node_top is None:
+            return []
+
+        return self.node_top[node]
+
+
+    def search_fuzzy(self, word, max_distance):
+        '''
+        Finds the words in the trie within an edit distance of the given
+        word, in the same way as TrieNode.search_fuzzy.
+
+        Inputs:
+            word: (string) The given word.
+            max_distance: (int) The largest edit distance.
+
+        Returns: list of (distance, word) pairs.
+        '''
+        matches = []
+        stack = [(0, "", list(range(len(word) + 1)))]
+
+        while stack:
+            (node, prefix, row) = stack.pop()
+            if self.node_completion[node] and row[-1] <= max_distance:
+                matches.append((row[-1], prefix))
+            if min(row) > max_distance:
+                continue
+            for child in range(self.first_child[node],
+                               self.first_child[node + 1]):
+                char = chr(self.labels[child])
+                stack.append((child, prefix + char,
+                              next_row(row, word, char)))
+
+        return matches
+
+
+    def nbytes(self):
+        '''
+        Returns the number of bytes used by the arrays of the trie.
+        '''
+        return sum(a.itemsize * len(a) for a in
+                   [self.labels, self.first_child, self.node_count,
+                    self.node_completion])
+
+
+    def save(self, imagefile):
+        '''
+        Writes the trie to a dictionary image.
+
+        Inputs:
+            imagefile: (string) The name of the image file.
+        '''
+        with open(imagefile, "wb") as f:
+            f.write(IMAGE_HEADER.pack(IMAGE_MAGIC, len(self.labels)))
+            for a in [self.labels, self.first_child, self.node_count,
+                      self.node_completion]:
+                f.write(bytes(a))
+
+
+def next_row(row, word, char):
+    '''
+    Computes the next row of the Levenshtein table of a word.
+
+    Inputs:
+        row: (list) the edit distances between a prefix and each prefix
+          of the word (row[j] is the distance to word[:j])
+        word: (string) the word
+        char: (string) the character added to the prefix
+
+    Returns: list of the edit distances between the longer prefix and each
+      prefix of the word
+    '''
+    new_row = [row[0] + 1]
+    for j in range(1, len(row)):
+        cost = 0 if word[j - 1] == char else 1
+        new_row.append(min(new_row[j - 1] + 1, row[j] + 1,
+                           row[j - 1] + cost))
+
+    return new_row
+
+
+def count_prefixes(prefixes, root, find_child, get_count):
+    '''
+    Counts the words below the node of each prefix. The prefixes are
+    visited in sorted order and the path of nodes to the previous prefix
+    is kept, so only the characters after the part it has in common with
+    the previous prefix are looked up.
+
+    Inputs:
+        prefixes: (list) the prefixes
+        root: the root node of the trie
+        find_child: (function) takes a node and a character, and returns
+          the child or None
+        get_count: (function) takes a node and returns its word count
+
+    Returns: list of ints, in the order of the prefixes.
+    '''
+    counts = [0] * len(prefixes)
+    path = [root]
+    previous = ""
+
+    for i in sorted(range(len(prefixes)), key=prefixes.__getitem__):
+        prefix = prefixes[i]
+        common = 0
+        limit = min(len(prefix), len(previous), len(path) - 1)
+        while common < limit and prefix[common] == previous[common]:
+            common += 1
+        del path[common + 1:]
+
+        node = path[-1]
+        for char in prefix[common:]:
+            node = find_child(node, char)
+            if node is None:
+                break
+            path.append(node)
+
+        if node is not None:
+            counts[i] = get_count(node)
+        previous = prefix
+
+    return counts
+
+
+def build_compact_trie(words):
+    '''
+    Builds a CompactTrie from words, one level at a time: the sorted words
+    below a node form a contiguous range, which is split into one range per
+    child by the character at the depth of the node.
+
+    Inputs:
+        words: (iterable) the words; empty strings and repeats are ignored.
+
+    Returns: CompactTrie
+    '''
+    words = sorted(set(w for w in words if w != ""))
+
+    labels = array('I', [0])
+    first_child = array('I')
+    node_count = array('I', [len(words)])
+    node_completion = array('B', [0])
+    queue = deque([(0, len(words), 0)])
+
+    while queue:
+        (lo, hi, depth) = queue.popleft()
+        first_child.append(len(labels))
+
+        i = lo
+        if i < hi and len(words[i]) == depth:
+            i += 1
+
+        while i < hi:
+            char = words[i][depth]
+            j = i + 1
+            while j < hi and words[j][depth] == char:
+                j += 1
+
+            labels.append(ord(char))
+            node_count.append(j - i)
+            node_completion.append(1 if len(words[i]) == depth + 1 else 0)
+            queue.append((i, j, depth + 1))
+            i = j
+
+    first_child.append(len(labels))
+
+    return CompactTrie(labels, first_child, node_count, node_completion)
+
+
+def compile_dictionary(wordfile, imagefile):
+    '''
+    Compiles a file of words into a dictionary image.
+
+    Inputs:
+        wordfile: (string) name of the file with the words.
+        imagefile: (string) name of the image file to write.
+    '''
+    with open(wordfile) as f:
+        build_compact_trie(w.strip() for w in f).save(imagefile)
+
+
+def read_frequencies(freqfile):
+    '''
+    Reads a file with one "word frequency" line per word.
+
+    Inputs:
+        freqfile: (string) name of the file.
+
+    Returns: dictionary mapping each word to its frequency.
+    '''
+    frequencies = {}
+    with open(freqfile) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                frequencies[fields[0]] = int(fields[1])
+
+    return frequencies
+
+
+def is_image(filename):
+    '''
+    Does the file start like a dictionary image?
+    '''
+    with open(filename, "rb") as f:
+        return f.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
+
+
+def load_compact_trie(imagefile):
+    '''
+    Maps a dictionary image into memory. The arrays of the returned
+    CompactTrie are views of the mapping, so loading does not depend on the
+    size of the dictionary and processes that load the same image share it.
+
+    Inputs:
+        imagefile: (string) name of the image file.
+
+    Returns: CompactTrie
+    '''
+    with open(imagefile, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, num_nodes) = IMAGE_HEADER.unpack_from(mm)
+    if magic != IMAGE_MAGIC:
+        raise ValueError(imagefile + " is not a dictionary image")
+
+    view = memoryview(mm)
+    offset = IMAGE_HEADER.size
+    arrays = []
+    for (code, length) in [('I', num_nodes), ('I', num_nodes + 1),
+                           ('I', num_nodes), ('B', num_nodes)]:
+        size = struct.calcsize(code) * length
+        arrays.append(view[offset:offset + size].cast(code))
+        offset += size
+
+    return CompactTrie(*arrays)
+
+
 if __name__ == "__main__":
-    autocorrect_shell.go("english_dictionary")
+    if len(sys.argv) == 4 and sys.argv[1] == "compile":
+        compile_dictionary(sys.argv[2], sys.argv[3])
+    else:
+        autocorrect_shell.go("english_dictionary")
@@ -0,0 +1,156 @@
+# CS122 W'18: Markov models and hash tables
+# Order sweep for speaker identification
+#
+# Kyle Pinder
+
+import argparse
+import csv
+import sys
+import time
+from multiprocessing import Pool
+
+import Markov
+
+
+def read_labelled_texts(filename):
+    '''
+    Reads a CSV file with one "speaker,file name" row per text to identify.
+
+    Inputs:
+        filename: (string) the name of the CSV file
+
+    Returns: list of (speaker, text) pairs
+    '''
+
+    labelled = []
+
+    with open(filename) as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            with open(row[1].strip()) as text_file:
+                labelled.append((row[0].strip(), text_file.read()))
+
+    return labelled
+
+
+def evaluate_order(args):
+    '''
+    Trains the speaker models for one order and identifies every labelled
+    text with them.
+
+    Inputs:
+        args: (tuple) the order, the list of speaker names, the list of
+          their sample texts and the list of (speaker, text) pairs
+
+    Returns: (order, accuracy, training seconds, texts scored per second)
+    '''
+
+    (order, names, speeches, labelled) = args
+
+    start = time.perf_counter()
+    identifier = Markov.Speaker_Identifier(speeches, order)
+    trained = time.perf_counter()
+    (_, best) = identifier.score([text for (_, text) in labelled])
+    scored = time.perf_counter()
+
+    correct = sum(1 for (label, _), i in zip(labelled, best)
+                  if names[i] == label)
+    accuracy = correct / len(labelled) if labelled else 0.0
+    throughput = len(labelled) / (scored - trained) if scored > trained \
+        else float("inf")
+
+    return (order, accuracy, trained - start, throughput)
+
+
+def sweep(speakers, labelled, orders, workers):
+    '''
+    Evaluates speaker identification for every order, one order per task
+    in a pool of "workers" processes.
+
+    Inputs:
+        speakers: (list) (speaker, sample text) pairs
+        labelled: (list) (speaker, text) pairs to identify
+        orders: (list) the orders to try
+        workers: (int) the number of processes
+
+    Returns: list of evaluate_order results, by order
+    '''
+
+    names = [name for (name, _) in speakers]
+    speeches = [speech for (_, speech) in speakers]
+    tasks = [(order, names, speeches, labelled) for order in orders]
+
+    if workers <= 1:
+        return [evaluate_order(task) for task in tasks]
+
+    with Pool(workers) as pool:
+        return pool.map(evaluate_order, tasks)
+
+
+def print_sweep(results):
+    '''
+    Prints the results of sweep.
+    '''
+
+    print("{:>6} {:>10} {:>12} {:>12}".format("order", "accuracy",
+                                              "train (s)", "texts/sec"))
+    for (order, accuracy, train_time, throughput) in results:
+        print("{:>6} {:>10.3f} {:>12.2f} {:>12.1f}".format(
+            order, accuracy, train_time, throughput))
+
+
+def parse_args(args):
+    '''
+    Parse the arguments
+
+    Inputs:
+        args: list of strings
+
+    Result: parsed argument object.
+    '''
+
+    s = 'Find the Markov model order that identifies speakers best.'
+    parser = argparse.ArgumentParser(description=s)
+    parser.add_argument('-s', '--speaker', action="append",
+                        help="<speaker>=<file name of sample text>",
+                        type=str, default=[])
+    parser.add_argument('-o', '--orders', nargs=2,
+                        help="first and last order to try",
+                        type=int, default=[1, 8])
+    parser.add_argument('-w', '--workers', nargs=1,
+                        help="number of processes",
+                        type=int, default=[1])
+    parser.add_argument('labels', nargs=1,
+                        help='CSV file of "speaker,file name" rows to identify')
+
+    return parser.parse_args(args[1:])
+
+
+def go(args):
+    '''
+    Reads the texts, runs the sweep and prints the results.
+    '''
+
+    speakers = []
+    for spec in args.speaker:
+        if "=" not in spec:
+            print("Invalid speaker (expected <speaker>=<file name>):", spec,
+                  file=sys.stderr)
+            sys.exit(1)
+        (name, filename) = spec.split("=", 1)
+        with open(filename) as f:
+            speakers.append((name, f.read()))
+
+    if len(speakers) < 2:
+        print("At least two speakers are needed.", file=sys.stderr)
+        sys.exit(1)
+
+    labelled = read_labelled_texts(args.labels[0])
+    orders = list(range(args.orders[0], args.orders[1] + 1))
+
+    print_sweep(sweep(speakers, labelled, orders, args.workers[0]))
+
+
+if __name__ == "__main__":
+    go(parse_args(sys.argv))
@@ -18,6 +18,7 @@ from analyze import find_top_k_entities, find_min_count_entities
 from analyze import find_frequent_entities, find_top_k_ngrams
 from analyze import find_min_count_ngrams, find_frequent_ngrams
 from analyze import find_top_k_ngrams_by_month
+import analyze
 from util import sort_count_pairs
 
 # Get the test files from the same directory as
@@ -382,3 +383,90 @@ def test_task7_3():
     '''
     helper({'task': 'task7', 'arg2': 1, 'tweet_filename': 'data/corner-2.json', 'arg1': 1, 'expected_filename': 'data/test-task7-3-expected.json'})
 
+
+######### TweetStream #########
+
+TWEETS = [{"text": "Vote Labour! #GE2017", "id": 12345678901234567890},
+          {"text": "café à la \"gare\", {ok}", "id": 1,
+           "entities": {"hashtags": [], "urls": [{"url": "http://x"}]}},
+          {"text": "", "id": 2, "retweet": None}]
+
+def write_tweets(path, layout):
+    '''
+    Writes TWEETS to a file as a JSON array, an indented JSON array or
+    newline-delimited JSON.
+    '''
+    with open(path, "w") as f:
+        if layout == "array":
+            json.dump(TWEETS, f)
+        elif layout == "indented":
+            json.dump(TWEETS, f, indent=4)
+        else:
+            f.write("\n".join(json.dumps(t) for t in TWEETS) + "\n")
+
+@pytest.mark.parametrize("layout", ["array", "indented", "ndjson"])
+@pytest.mark.parametrize("read_size", [1, 3, 7, 1 << 16])
+def test_tweet_stream_matches_json_load(tmp_path, monkeypatch, layout,
+                                        read_size):
+    '''
+    tweets split across reads of any size come out whole
+    '''
+    monkeypatch.setattr(analyze, "READ_SIZE", read_size)
+    path = str(tmp_path / "tweets.json")
+    write_tweets(path, layout)
+
+    assert list(analyze.TweetStream(path)) == TWEETS
+    if layout != "ndjson":
+        with open(path) as f:
+            assert list(analyze.TweetStream(path)) == json.load(f)
+
+def test_tweet_stream_empty(tmp_path):
+    '''
+    corner cases: empty file and empty array
+    '''
+    for text in ["", "[]", "  [\n]\n"]:
+        path = str(tmp_path / "tweets.json")
+        with open(path, "w") as f:
+            f.write(text)
+        assert list(analyze.TweetStream(path)) == []
+
+def test_tweet_stream_rejects_scalars(tmp_path, monkeypatch):
+    '''
+    a number split across reads is not decoded as several numbers
+    '''
+    monkeypatch.setattr(analyze, "READ_SIZE", 4)
+    path = str(tmp_path / "tweets.json")
+    with open(path, "w") as f:
+        f.write("[12345678901234567890]")
+
+    with pytest.raises(json.JSONDecodeError):
+        list(analyze.TweetStream(path))
+
+def test_tweet_stream_malformed_tweet(tmp_path, monkeypatch):
+    '''
+    a malformed tweet is reported without reading the rest of the file
+    '''
+    monkeypatch.setattr(analyze, "READ_SIZE", 4)
+    monkeypatch.setattr(analyze, "MAX_TWEET_SIZE", 64)
+    path = str(tmp_path / "tweets.json")
+    with open(path, "w") as f:
+        f.write('[{"text": "ok"}, {"text": oops}, ' +
+                ", ".join(json.dumps(t) for t in TWEETS * 1000) + "]")
+
+    sizes = []
+    def counting_open(*args):
+        f = open(*args)
+        read = f.read
+        def counting_read(size=-1):
+            text = read(size)
+            sizes.append(len(text))
+            return text
+        f.read = counting_read
+        return f
+    monkeypatch.setattr(analyze, "open", counting_open, raising=False)
+
+    stream = iter(analyze.TweetStream(path))
+    assert next(stream) == {"text": "ok"}
+    with pytest.raises(json.JSONDecodeError):
+        next(stream)
+    assert sum(sizes) < 4 * 64
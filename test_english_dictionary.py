@@ -0,0 +1,123 @@
+# CS122: Auto-completing keyboard using Tries
+# Tests for english_dictionary
+#
+# Kyle Pinder
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+import english_dictionary
+
+PREFIXES = ["", "a", "ab", "b", "ca", "zz", "été", "q"]
+
+
+@pytest.fixture(scope="module")
+def dictionaries(tmp_path_factory):
+    '''
+    Builds the same dictionary as a trie of TrieNodes, as a CompactTrie and
+    from a compiled image.
+    '''
+
+    rng = random.Random(0)
+    words = ["".join(rng.choice("abcé") for _ in range(rng.randint(1, 6)))
+             for _ in range(800)] + ["été", "ca", "cab", "cab"]
+    rng.shuffle(words)
+
+    directory = tmp_path_factory.mktemp("words")
+    wordfile = str(directory / "words.txt")
+    imagefile = str(directory / "words.img")
+    with open(wordfile, "w") as f:
+        f.write("\n".join(words) + "\n\n")
+    english_dictionary.compile_dictionary(wordfile, imagefile)
+
+    return (sorted(set(words)),
+            english_dictionary.EnglishDictionary(wordfile),
+            [english_dictionary.EnglishDictionary(wordfile, compact=True),
+             english_dictionary.EnglishDictionary(imagefile)])
+
+
+def test_is_word(dictionaries):
+    (words, trie, others) = dictionaries
+    queries = words[:100] + ["", "zz", "abcabcabc", words[0] + "z"]
+
+    for other in others:
+        assert [other.is_word(w) for w in queries] == \
+            [trie.is_word(w) for w in queries]
+
+
+def test_num_completions(dictionaries):
+    (words, trie, others) = dictionaries
+    prefixes = PREFIXES + [w[:2] for w in words[:50]]
+
+    for other in others:
+        assert [other.num_completions(p) for p in prefixes] == \
+            [trie.num_completions(p) for p in prefixes]
+        assert other.num_completions_many(prefixes) == \
+            [trie.num_completions(p) for p in prefixes]
+
+
+def test_get_completions(dictionaries):
+    (words, trie, others) = dictionaries
+
+    for prefix in PREFIXES:
+        expected = sorted(trie.get_completions(prefix))
+        assert expected == sorted(w[len(prefix):] for w in words
+                                  if w.startswith(prefix))
+        for other in others:
+            assert other.get_completions(prefix) == expected
+
+
+def test_iter_completions_pages(dictionaries):
+    (_, trie, others) = dictionaries
+
+    for prefix in PREFIXES:
+        expected = sorted(trie.get_completions(prefix))
+        for dictionary in [trie] + others:
+            assert list(dictionary.iter_completions(prefix)) == expected
+            for size in [1, 7, 100]:
+                pages = []
+                page = list(dictionary.iter_completions(prefix, size))
+                while page:
+                    pages.extend(page)
+                    page = list(dictionary.iter_completions(prefix, size,
+                                                            page[-1]))
+                assert pages == expected
+
+
+def test_get_corrections(dictionaries):
+    (_, trie, others) = dictionaries
+
+    for word in ["abc", "cbé", "aaaa", "zzz", ""]:
+        for max_distance in [0, 1, 2]:
+            expected = trie.get_corrections(word, max_distance)
+            for other in others:
+                assert other.get_corrections(word, max_distance) == expected
+
+
+def test_top_completions(tmp_path):
+    wordfile = str(tmp_path / "words.txt")
+    freqfile = str(tmp_path / "freq.txt")
+    words = ["car", "card", "care", "cart", "cat", "dog", "do"]
+    with open(wordfile, "w") as f:
+        f.write("\n".join(words) + "\n")
+    with open(freqfile, "w") as f:
+        f.write("car 5\ncard 1\ncare 9\ncat 5\ndo 2\n")
+
+    trie = english_dictionary.EnglishDictionary(wordfile, freqfile=freqfile)
+    assert trie.top_k == english_dictionary.TOP_K
+
+    for dictionary in [trie,
+                       english_dictionary.EnglishDictionary(
+                           wordfile, True, freqfile),
+                       english_dictionary.EnglishDictionary(
+                           wordfile, freqfile=freqfile, top_k=0)]:
+        assert dictionary.top_completions("ca", 3) == ["re", "r", "t"]
+        assert dictionary.top_completions("ca", 20) == \
+            ["re", "r", "t", "rd", "rt"]
+        assert dictionary.top_completions("d", 1) == ["o"]
+        assert dictionary.top_completions("x", 2) == []
@@ -0,0 +1,182 @@
+# CS122 W'18: Markov models and hash tables
+# Tests for Hash_Table
+#
+# Kyle Pinder
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+import Hash_Table
+
+NUM_KEYS = 300
+NUM_OPS = 6000
+
+
+def check_against_dict(table, seed, num_ops=NUM_OPS):
+    '''
+    Applies a random sequence of updates, increments, decrements and
+    deletions to the table and to a dict, and checks that the table always
+    holds what the dict does.
+    '''
+
+    rng = random.Random(seed)
+    expected = {}
+    keys = ["key" + str(i) for i in range(NUM_KEYS)]
+
+    for i in range(num_ops):
+        key = rng.choice(keys)
+        op = rng.random()
+        if op < 0.3:
+            val = rng.randrange(1, 10)
+            table.update(key, val)
+            expected[key] = val
+        elif op < 0.55:
+            table.increment(key, 2)
+            expected[key] = expected.get(key, 0) + 2
+        elif op < 0.7:
+            table.decrement(key)
+            expected[key] = expected.get(key, 0) - 1
+            if expected[key] == 0:
+                del expected[key]
+        else:
+            table.delete(key)
+            expected.pop(key, None)
+
+        if i % 500 == 0:
+            assert [table.lookup(k) for k in keys] == \
+                [expected.get(k, 0) for k in keys]
+
+    assert [table.lookup(k) for k in keys] == \
+        [expected.get(k, 0) for k in keys]
+    assert sorted(table.items()) == sorted(expected.items())
+
+    return expected
+
+
+@pytest.mark.parametrize("hash_mode", [Hash_Table.SUM_HASH,
+                                       Hash_Table.FNV_HASH])
+@pytest.mark.parametrize("incremental", [False, True])
+def test_hash_table_matches_dict(hash_mode, incremental):
+    for seed in range(3):
+        table = Hash_Table.Hash_Table(7, 0, hash_mode, incremental)
+        check_against_dict(table, seed)
+
+
+@pytest.mark.parametrize("hash_mode", [Hash_Table.SUM_HASH,
+                                       Hash_Table.FNV_HASH])
+@pytest.mark.parametrize("incremental", [False, True])
+def test_hash_table_shrinks_after_deletes(hash_mode, incremental):
+    table = Hash_Table.Hash_Table(7, 0, hash_mode, incremental)
+    keys = ["key" + str(i) for i in range(2000)]
+    for key in keys:
+        table.increment(key)
+    grown = table.cells
+
+    for key in keys[10:]:
+        table.delete(key)
+
+    assert table.cells < grown
+    assert sorted(table.items()) == [(key, 1) for key in sorted(keys[:10])]
+
+
+def test_compact_hash_table_matches_dict():
+    for seed in range(3):
+        check_against_dict(Hash_Table.Compact_Hash_Table(4), seed)
+
+
+def test_sharded_hash_table_matches_dict():
+    for seed in range(3):
+        check_against_dict(Hash_Table.Sharded_Hash_Table(3, 4), seed)
+
+
+def test_compact_hash_table_drops_dead_entries():
+    table = Hash_Table.Compact_Hash_Table(4)
+    keys = ["key" + str(i) for i in range(1000)]
+    for key in keys:
+        table.increment(key)
+    for key in keys[:900]:
+        table.delete(key)
+
+    assert len(table.counts) < 1000
+    assert sorted(table.items()) == [(key, 1) for key in sorted(keys[900:])]
+
+
+def test_count_min_sketch_cannot_be_updated():
+    sketch = Hash_Table.Count_Min_Sketch(64, 3)
+
+    with pytest.raises(TypeError):
+        sketch.update_many([("a", 1)])
+
+
+def fill_counts(table, num_keys=500):
+    '''
+    Counts some keys (including non-ASCII ones) into the table.
+    '''
+
+    for i in range(num_keys):
+        table.increment("key" + str(i % 97) + "é" * (i % 3))
+        table.increment(str(i))
+
+    return sorted(table.items())
+
+
+@pytest.mark.parametrize("make_table", [
+    lambda: Hash_Table.Compact_Hash_Table(4),
+    lambda: Hash_Table.Sharded_Hash_Table(3, 4),
+    lambda: Hash_Table.Hash_Table(7, 0)])
+def test_save_table_round_trip(tmp_path, make_table):
+    table = make_table()
+    expected = fill_counts(table)
+    filename = str(tmp_path / "table.htbl")
+
+    Hash_Table.save_table(table, filename, {"k": 3, "name": "test"})
+    mapped = Hash_Table.Mapped_Hash_Table(filename)
+
+    assert sorted(mapped.items()) == expected
+    assert [mapped.lookup(key) for (key, _) in expected] == \
+        [val for (_, val) in expected]
+    assert mapped.lookup("missing") == 0
+    assert mapped.meta == {"k": 3, "name": "test"}
+    with pytest.raises(TypeError):
+        mapped.increment("key1")
+    with pytest.raises(TypeError):
+        mapped.merge(Hash_Table.Compact_Hash_Table(4))
+    with pytest.raises(TypeError):
+        mapped.rehash()
+
+
+def test_save_table_after_deletes(tmp_path):
+    table = Hash_Table.Compact_Hash_Table(4)
+    fill_counts(table)
+    for i in range(0, 500, 2):
+        table.delete(str(i))
+    filename = str(tmp_path / "table.htbl")
+
+    Hash_Table.save_table(table, filename)
+    mapped = Hash_Table.Mapped_Hash_Table(filename)
+
+    assert sorted(mapped.items()) == sorted(table.items())
+    assert mapped.lookup("0") == 0
+    assert mapped.lookup("1") == 1
+
+
+def test_save_sketch_round_trip(tmp_path):
+    sketch = Hash_Table.Count_Min_Sketch(64, 3)
+    sketch.increment_many(str(i % 50) for i in range(1000))
+    filename = str(tmp_path / "sketch.cmsk")
+
+    Hash_Table.save_table(sketch, filename, {"k": 2})
+    mapped = Hash_Table.open_table(filename)
+
+    assert isinstance(mapped, Hash_Table.Mapped_Count_Min_Sketch)
+    assert (mapped.width, mapped.depth) == (64, 3)
+    assert mapped.lookup_many(str(i) for i in range(60)) == \
+        sketch.lookup_many(str(i) for i in range(60))
+    assert mapped.meta == {"k": 2}
+    with pytest.raises(TypeError):
+        mapped.increment("1")
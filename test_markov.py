@@ -0,0 +1,191 @@
+# CS122 W'18: Markov models and hash tables
+# Tests for Markov
+#
+# Kyle Pinder
+
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+import Markov
+
+SPEECH = ("It was the best of times, it was the worst of times, it was the "
+          "age of wisdom, it was the age of foolishness.\n")
+QUERY = "it was the season of Light, it was the season of Darkness"
+
+
+def test_save_load_round_trip(tmp_path):
+    model = Markov.Markov(3, SPEECH)
+    filename = str(tmp_path / "model.htbl")
+
+    model.save(filename)
+    loaded = Markov.load_markov(filename)
+
+    assert loaded.k == model.k
+    assert loaded.num_char_used == model.num_char_used
+    assert sorted(loaded.ht.items()) == sorted(model.ht.items())
+    assert loaded.log_probability(QUERY) == model.log_probability(QUERY)
+
+
+def split_text(text, size):
+    '''
+    Splits a text into chunks of "size" characters.
+    '''
+
+    return [text[i:i+size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("engine", [Markov.PYTHON_ENGINE,
+                                    Markov.NUMPY_ENGINE])
+def test_train_from_chunks_matches_markov(engine):
+    if engine == Markov.NUMPY_ENGINE:
+        pytest.importorskip("numpy")
+
+    for text in [SPEECH, "abc", "ab", "a"]:
+        for k in [1, 2, 3, 5]:
+            expected = Markov.Markov(k, text)
+            for size in [1, 2, 4, 7, 1000]:
+                model = Markov.train_from_chunks(k, split_text(text, size),
+                                                 engine)
+                assert sorted(model.ht.items()) == \
+                    sorted(expected.ht.items()), (text, k, size)
+                assert model.num_char_used == expected.num_char_used
+
+
+def test_parallel_counts_match_serial():
+    for text in [SPEECH, "ab", ""]:
+        expected = Markov.Markov(3, text)
+        model = Markov.Markov(3, text, workers=3)
+
+        assert sorted(model.ht.items()) == sorted(expected.ht.items())
+        assert model.num_char_used == expected.num_char_used
+
+
+def test_markov_pickles():
+    model = Markov.Markov(2, SPEECH)
+    prob = model.log_probability(QUERY)
+
+    copy = pickle.loads(pickle.dumps(model))
+
+    assert copy.log_probability(QUERY) == prob
+    assert sorted(copy.ht.items()) == sorted(model.ht.items())
+
+
+def test_log_probability_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(Markov, "LOG_PROB_CACHE_SIZE", 8)
+    model = Markov.Markov(2, SPEECH)
+    expected = Markov.Markov(2, SPEECH).compute_gram_log_probability
+
+    for text in [QUERY, SPEECH, QUERY]:
+        for r in range(len(text) - 2):
+            gram = text[r:r+3]
+            assert model.gram_log_probability(gram) == expected(gram)
+            assert len(model.log_prob_cache) <= 8
+
+
+def test_save_load_sketch_round_trip(tmp_path):
+    model = Markov.Markov(3, SPEECH, memory_budget=4096)
+    filename = str(tmp_path / "model.cmsk")
+
+    model.save(filename)
+    loaded = Markov.load_markov(filename)
+
+    assert loaded.k == model.k
+    assert loaded.num_char_used == model.num_char_used
+    assert list(loaded.ht.counts) == list(model.ht.counts)
+    assert loaded.log_probability(QUERY) == model.log_probability(QUERY)
+
+
+@pytest.mark.parametrize("engine", [Markov.PYTHON_ENGINE,
+                                    Markov.NUMPY_ENGINE])
+def test_alphabet_size(engine):
+    if engine == Markov.NUMPY_ENGINE:
+        pytest.importorskip("numpy")
+
+    assert Markov.Markov(2, SPEECH, engine=engine).num_char_used == \
+        len(set(SPEECH))
+    assert Markov.Markov(2, "a\udcffa", engine=engine).num_char_used == 2
+
+
+def test_incremental_scorer_matches_log_probability():
+    model = Markov.Markov(3, SPEECH)
+
+    for text in [QUERY, "it", "it w", "a", ""]:
+        for size in [1, 2, 5, 1000]:
+            scorer = model.scorer()
+            for chunk in split_text(text, size):
+                scorer.append(chunk)
+            assert scorer.log_probability() == \
+                pytest.approx(model.log_probability(text)), (text, size)
+
+
+def test_incremental_scorer_window():
+    model = Markov.Markov(2, SPEECH)
+    window = 10
+    scorer = model.scorer(window)
+    probs = [model.gram_log_probability(QUERY[r:r+3])
+             for r in range(len(QUERY) - 2)]
+
+    for chunk in split_text(QUERY, 3):
+        scorer.append(chunk)
+
+    assert scorer.window_likelihood() == \
+        pytest.approx(sum(probs[-window:]) / window)
+
+
+@pytest.mark.parametrize("engine", [Markov.PYTHON_ENGINE,
+                                    Markov.NUMPY_ENGINE])
+def test_multi_order_markov_matches_markov(engine):
+    if engine == Markov.NUMPY_ENGINE:
+        pytest.importorskip("numpy")
+
+    max_k = 4
+    multi = Markov.Multi_Order_Markov(max_k, SPEECH, engine)
+
+    for k in range(1, max_k + 1):
+        expected = Markov.Markov(k, SPEECH, engine=engine)
+        assert multi.log_probability(QUERY, k) == \
+            pytest.approx(expected.log_probability(QUERY))
+    with pytest.raises(ValueError):
+        multi.get_model(max_k + 1)
+
+
+def test_speaker_identifier_matches_identify_speaker():
+    speeches = [SPEECH, QUERY, "the quick brown fox jumps over the lazy dog"]
+    texts = ["it was the age of Light", "the quick brown dog jumps",
+             "the worst of times"]
+    identifier = Markov.Speaker_Identifier(speeches, 2)
+
+    (likelihoods, best) = identifier.score(texts)
+
+    for text, row, index in zip(texts, likelihoods, best):
+        expected = [Markov.identify_speaker(speech, speeches[0], text, 2)[0]
+                    for speech in speeches]
+        assert row == pytest.approx(expected)
+        assert index == expected.index(max(expected))
+        for other in range(len(speeches)):
+            conclusion = Markov.identify_speaker(
+                speeches[index], speeches[other], text, 2)[2]
+            assert conclusion in ["A", "A or B"]
+
+
+def test_approximation_report():
+    speeches = [SPEECH, QUERY]
+    texts = [QUERY, SPEECH, "the age of Light"]
+
+    report = Markov.approximation_report(2, speeches, texts, None)
+    assert report["mean_drift"] == 0.0
+    assert report["max_drift"] == 0.0
+    assert report["agreement"] == 1.0
+    assert report["exact_bytes"] == report["approx_bytes"] > 0
+
+    report = Markov.approximation_report(2, speeches, texts, 4096)
+    assert report["approx_bytes"] == 2 * 4096
+    assert report["exact_bytes"] == \
+        sum(Markov.Markov(2, s).ht.nbytes() for s in speeches)
+    assert 0 <= report["mean_drift"] <= report["max_drift"]
+    assert 0 <= report["agreement"] <= 1